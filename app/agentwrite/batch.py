@@ -0,0 +1,168 @@
+"""
+OpenAI Batch API mode for the agentwrite scripts.
+
+Pending requests are written to Batch API request files, submitted, polled and
+merged back by the calling script. The ids of submitted batches are kept in a
+state file, so a run can submit and exit (--no-wait) and a later run with the
+same arguments picks up the results instead of resubmitting.
+
+The client honours OPENAI_BASE_URL, so the whole flow can be exercised against a
+local stand-in for the files and batches endpoints; batch_standin.py runs it against
+an in-memory one.
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from utils.openai_utils import get_openai_client
+from utils.llm_cache import make_cache_key, lookup_completion, store_completion
+
+ENDPOINT = "/v1/chat/completions"
+MAX_REQUESTS_PER_BATCH = 50000
+FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+def chat_request(custom_id, model, prompt, max_tokens, temperature=1.0, stop=None):
+    """
+    One line of a Batch API request file, with the same body get_response_gpt4 sends.
+    """
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": ENDPOINT,
+        "body": {
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stop": stop,
+        },
+    }
+
+def _cache_key(request):
+    body = request["body"]
+    return make_cache_key(body["model"], body["messages"], temperature=body["temperature"],
+                          max_tokens=body["max_tokens"], stop=body["stop"])
+
+def submit_batches(client, requests):
+    """
+    Uploads the requests as one or more request files and creates a batch for each.
+    Returns the batch ids.
+    """
+    batch_ids = []
+    for start in range(0, len(requests), MAX_REQUESTS_PER_BATCH):
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False, encoding="utf-8") as f:
+            for request in requests[start:start + MAX_REQUESTS_PER_BATCH]:
+                f.write(json.dumps(request, ensure_ascii=False) + "\n")
+        try:
+            with open(f.name, "rb") as request_file:
+                input_file = client.files.create(file=request_file, purpose="batch")
+        finally:
+            os.remove(f.name)
+        batch = client.batches.create(input_file_id=input_file.id, endpoint=ENDPOINT, completion_window="24h")
+        print(f"Submitted batch {batch.id} with {min(MAX_REQUESTS_PER_BATCH, len(requests) - start)} requests")
+        batch_ids.append(batch.id)
+    return batch_ids
+
+def poll_batches(client, batch_ids, wait=True, poll_interval=30):
+    """
+    Returns the batches once all of them are final, or None if wait is False and some
+    are still running.
+    """
+    while True:
+        batches = [client.batches.retrieve(batch_id) for batch_id in batch_ids]
+        pending = [batch for batch in batches if batch.status not in FINAL_STATUSES]
+        for batch in batches:
+            counts = batch.request_counts
+            print(f"Batch {batch.id}: {batch.status}" + (f" ({counts.completed}/{counts.total} done)" if counts else ""))
+        if not pending:
+            return batches
+        if not wait:
+            return None
+        time.sleep(poll_interval)
+
+def download_results(client, batches):
+    """
+    Returns {custom_id: message content} for every successful request of the batches.
+    Requests that failed or came back without content are left out, so they run again.
+    """
+    results = {}
+    for batch in batches:
+        if batch.error_file_id:
+            for line in client.files.content(batch.error_file_id).text.splitlines():
+                error = json.loads(line)
+                print(f"Request {error['custom_id']} failed: {error.get('error') or error.get('response')}")
+        if not batch.output_file_id:
+            continue
+        for line in client.files.content(batch.output_file_id).text.splitlines():
+            output = json.loads(line)
+            response = output.get("response") or {}
+            if output.get("error") or response.get("status_code") != 200:
+                print(f"Request {output['custom_id']} failed: {output.get('error') or response.get('body')}")
+                continue
+            try:
+                content = response["body"]["choices"][0]["message"]["content"]
+            except (KeyError, IndexError, TypeError):
+                content = None
+            if not content:
+                print(f"Request {output['custom_id']} returned no content")
+                continue
+            results[output["custom_id"]] = content
+    return results
+
+def run_batch(requests, state_file, wait=True, poll_interval=30, client=None, use_cache=True):
+    """
+    Runs the requests through the Batch API and returns {custom_id: content}, or None if
+    wait is False and the batches are still running (run again later to collect them).
+
+    The state file records the batches and the custom_ids they cover. When it exists, the
+    requests it does not cover yet (e.g. items added since the submit) are submitted as
+    further batches, and the results of all of them are collected together. Requests
+    that fail are missing from the result; the next run submits them again.
+
+    Requests already in the LLM response cache are answered from it, and all results are
+    stored there, so batch and interactive runs share their work (unless use_cache is False).
+    """
+    client = client or get_openai_client()
+
+    # cached: {custom_id: content} answered from the cache; cache_keys: {custom_id: key}
+    # of every submitted request
+    state = {"batch_ids": [], "cached": {}, "cache_keys": {}}
+    if os.path.exists(state_file):
+        with open(state_file, encoding="utf-8") as f:
+            state = json.load(f)
+        print(f"Resuming batches {state['batch_ids']}")
+
+    to_submit = []
+    for request in requests:
+        custom_id = request["custom_id"]
+        if custom_id in state["cached"] or custom_id in state["cache_keys"]:
+            continue
+        cached = lookup_completion(_cache_key(request)) if use_cache else None
+        if cached is not None:
+            state["cached"][custom_id] = cached
+        else:
+            to_submit.append(request)
+    if not state["batch_ids"] and not to_submit:
+        return state["cached"]
+    if to_submit:
+        state["batch_ids"] += submit_batches(client, to_submit)
+        state["cache_keys"].update({request["custom_id"]: _cache_key(request) for request in to_submit})
+        with open(state_file, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+
+    batches = poll_batches(client, state["batch_ids"], wait=wait, poll_interval=poll_interval)
+    if batches is None:
+        print("Batches are still running; run again to collect the results.")
+        return None
+
+    results = download_results(client, batches)
+    if use_cache:
+        for custom_id, content in results.items():
+            if custom_id in state["cache_keys"]:
+                store_completion(state["cache_keys"][custom_id], content)
+    results.update(state["cached"])
+    os.remove(state_file)
+    return results
@@ -0,0 +1,100 @@
+"""
+In-memory stand-in for the files and batches endpoints the Batch API mode uses.
+
+Running this file exercises batch.run_batch without the real API: a first call submits
+and exits while the batch is still running (--no-wait), a second call with one more
+request resumes it, submits the new request and merges all results. Requests whose
+prompt contains "fail" or "empty" come back as a failed line and a response without
+content, and must be left out of the results.
+
+    python batch_standin.py
+"""
+import os
+import json
+import tempfile
+import itertools
+from types import SimpleNamespace
+
+from batch import chat_request, run_batch
+
+class _Files:
+    def __init__(self):
+        self.contents = {}
+        self._ids = itertools.count(1)
+
+    def create(self, file, purpose):
+        file_id = f"file-{next(self._ids)}"
+        self.contents[file_id] = file.read().decode("utf-8")
+        return SimpleNamespace(id=file_id)
+
+    def content(self, file_id):
+        return SimpleNamespace(text=self.contents[file_id])
+
+class _Batches:
+    """
+    Batches finish on their second retrieve(), answering every request with its prompt
+    in upper case.
+    """
+
+    def __init__(self, files):
+        self.files = files
+        self.batches = {}
+        self._ids = itertools.count(1)
+
+    def create(self, input_file_id, endpoint, completion_window):
+        batch_id = f"batch-{next(self._ids)}"
+        self.batches[batch_id] = {"input_file_id": input_file_id, "retrieved": 0}
+        return SimpleNamespace(id=batch_id)
+
+    def _run(self, batch_id, input_file_id):
+        lines = []
+        for line in self.files.contents[input_file_id].splitlines():
+            request = json.loads(line)
+            prompt = request["body"]["messages"][0]["content"]
+            if "fail" in prompt:
+                response = {"status_code": 500, "body": {"error": "stand-in failure"}}
+            else:
+                content = None if "empty" in prompt else prompt.upper()
+                response = {"status_code": 200, "body": {"choices": [{"message": {"content": content}}]}}
+            lines.append(json.dumps({"custom_id": request["custom_id"], "response": response}))
+        output_file_id = f"{batch_id}-output"
+        self.files.contents[output_file_id] = "\n".join(lines)
+        return output_file_id
+
+    def retrieve(self, batch_id):
+        batch = self.batches[batch_id]
+        batch["retrieved"] += 1
+        total = len(self.files.contents[batch["input_file_id"]].splitlines())
+        if batch["retrieved"] < 2:
+            return SimpleNamespace(id=batch_id, status="in_progress", output_file_id=None, error_file_id=None,
+                                   request_counts=SimpleNamespace(completed=0, total=total))
+        if "output_file_id" not in batch:
+            batch["output_file_id"] = self._run(batch_id, batch["input_file_id"])
+        return SimpleNamespace(id=batch_id, status="completed", output_file_id=batch["output_file_id"],
+                               error_file_id=None, request_counts=SimpleNamespace(completed=total, total=total))
+
+class StandInClient:
+    """
+    Client with the files and batches attributes run_batch uses.
+    """
+
+    def __init__(self):
+        self.files = _Files()
+        self.batches = _Batches(self.files)
+
+def main():
+    client = StandInClient()
+    requests = [chat_request(prompt, "stand-in", prompt, 16) for prompt in ("one", "two", "empty", "fail")]
+    state_file = os.path.join(tempfile.mkdtemp(), "batch_state.json")
+
+    results = run_batch(requests[:3], state_file, wait=False, client=client, use_cache=False)
+    assert results is None and os.path.exists(state_file), results
+
+    results = run_batch(requests, state_file, poll_interval=0, client=client, use_cache=False)
+    assert results == {"one": "ONE", "two": "TWO"}, results
+    assert len(client.batches.batches) == 2, "the added request was not submitted"
+    assert not os.path.exists(state_file)
+    print("Batch stand-in run OK")
+
+if __name__ == "__main__":
+    main()
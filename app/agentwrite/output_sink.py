@@ -0,0 +1,161 @@
+"""
+Single-writer JSONL output for the agentwrite scripts.
+
+Records are queued and written by one background thread in batches, each record as one
+whole line, so concurrent producers never interleave. Next to the output file a sidecar
+index (<out_file>.idx) lists the hash of every completed prompt with the end offset of
+its record, so resuming reads the small index instead of parsing the whole output.
+"""
+import os
+import json
+import queue
+import hashlib
+import threading
+
+def prompt_hash(prompt):
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:32]
+
+class JsonlSink:
+    def __init__(self, path, key='prompt', batch_size=256):
+        """
+        Args:
+            path (str): The JSONL output file, appended to.
+            key (str): The record field that identifies an item.
+            batch_size (int): Maximum number of records written per flush.
+        """
+        self.path = path
+        self.index_path = path + '.idx'
+        self.key = key
+        self.batch_size = batch_size
+        self.completed = set()
+        self._recover()
+        self._queue = queue.Queue()
+        self._error = None
+        self._thread = threading.Thread(target=self._writer, daemon=True)
+        self._thread.start()
+
+    def _recover(self):
+        data_size = 0
+        if os.path.exists(self.path):
+            data_size = self._truncate_torn_tail(self.path)
+
+        indexed_size = 0
+        index_entries = []
+        if os.path.exists(self.index_path):
+            with open(self.index_path, encoding='utf-8') as f:
+                for line in f:
+                    parts = line.split()
+                    # A torn last line or an entry past the end of the data is ignored
+                    if len(parts) != 2 or not line.endswith('\n') or int(parts[1]) > data_size:
+                        break
+                    index_entries.append(line)
+                    self.completed.add(parts[0])
+                    indexed_size = int(parts[1])
+
+        with open(self.index_path, 'w', encoding='utf-8') as f:
+            f.writelines(index_entries)
+        if indexed_size < data_size:
+            # Records written after the last index update (or before the index existed)
+            self._index_tail(indexed_size)
+
+    @staticmethod
+    def _truncate_torn_tail(path):
+        """
+        Cuts off a last record that was only partly written and returns the file size.
+        """
+        with open(path, 'rb+') as f:
+            size = f.seek(0, os.SEEK_END)
+            if size == 0:
+                return 0
+            f.seek(size - 1)
+            if f.read(1) == b'\n':
+                return size
+            position = size
+            while position > 0:
+                step = min(65536, position)
+                position -= step
+                f.seek(position)
+                chunk = f.read(step)
+                newline = chunk.rfind(b'\n')
+                if newline != -1:
+                    position += newline + 1
+                    break
+            f.truncate(position)
+            print(f"Dropped a partly written record at the end of {path}")
+            return position
+
+    def _index_tail(self, offset):
+        entries = []
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                offset += len(line)
+                try:
+                    key = prompt_hash(json.loads(line)[self.key])
+                except (ValueError, KeyError):
+                    continue
+                self.completed.add(key)
+                entries.append(f"{key} {offset}\n")
+        with open(self.index_path, 'a', encoding='utf-8') as f:
+            f.writelines(entries)
+
+    def is_done(self, value):
+        """
+        True if a record with this key value (e.g. the prompt) has been written.
+        """
+        return prompt_hash(value) in self.completed
+
+    def write(self, record):
+        """
+        Queues a record for writing. Safe to call from any thread or coroutine.
+        """
+        if self._error:
+            raise self._error
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        self._queue.put((prompt_hash(record[self.key]), line.encode('utf-8')))
+
+    def _writer(self):
+        with open(self.path, 'ab') as fout, open(self.index_path, 'a', encoding='utf-8') as fidx:
+            offset = fout.seek(0, os.SEEK_END)
+            closing = False
+            while not closing:
+                batch = [self._queue.get()]
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if batch[-1] is None:
+                    closing = True
+                    batch.pop()
+                if not batch:
+                    continue
+                try:
+                    fout.write(b''.join(line for _, line in batch))
+                    fout.flush()
+                    # The index only ever lists records that are already in the output
+                    entries = []
+                    for key, line in batch:
+                        offset += len(line)
+                        self.completed.add(key)
+                        entries.append(f"{key} {offset}\n")
+                    fidx.writelines(entries)
+                    fidx.flush()
+                except Exception as e:
+                    self._error = e
+                    return
+
+    def close(self):
+        """
+        Writes the remaining queued records and stops the writer.
+        """
+        self._queue.put(None)
+        self._thread.join()
+        if self._error:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,127 +1,67 @@
-from turtle import dot
-import requests
-import time, os, json
-from transformers import AutoTokenizer, AutoModelForCausalLM
-import torch
-import numpy as np
-import random
-import codecs
+import json
+import hashlib
 import argparse
-from copy import deepcopy
-from tqdm import tqdm
-import traceback
-import re
-import torch.distributed as dist
-import torch.multiprocessing as mp
 from dotenv import load_dotenv
 load_dotenv()
 
-GPT4_API_KEY = os.getenv('OPENAI_API_KEY')
-GPT_MODEL = 'gpt-4o-2024-05-13'
-def get_response_gpt4(prompt, max_new_tokens=1024, temperature=1.0, stop=None):
-    tries = 0
-    while tries < 10:
-        tries += 1
-        try:
-            headers = {
-                'Authorization': "Bearer {}".format(GPT4_API_KEY),
-            }
-            messages = [
-                {'role': 'user', 'content': prompt},
-            ]
-            resp = requests.post("https://api.openai.com/v1/chat/completions", json = {
-                "model": GPT_MODEL,
-                "messages": messages,
-                "temperature": temperature,
-                "max_tokens": max_new_tokens,
-                "stop": stop,
-            }, headers=headers, timeout=600)
-            if resp.status_code != 200:
-                raise Exception(resp.text)
-            resp = resp.json()
-            break
-        except KeyboardInterrupt as e:
-            raise e
-        except Exception as e:
-            if "maximum context length" in str(e):
-                raise e
-            elif "triggering" in str(e):
-                return 'Trigger OpenAI\'s content management policy'
-            print("Error Occurs: \"%s\"        Retry ..."%(str(e)))
-    else:
-        print("Max tries. Failed.")
-        return "Max tries. Failed."
-    try:
-        return resp["choices"][0]["message"]["content"]
-    except: 
-        return ''
-
-def get_pred(rank, world_size, data, max_new_tokens, out_file, template):
-    with open(out_file, 'a', encoding='utf-8') as fout:
-        for item in tqdm(data):
-            prompt = item['prompt']
-            prompt = template.replace('$INST$', prompt)
-            try:
-                response = get_response_gpt4(prompt, max_new_tokens)
-                item["plan"] = response
-                fout.write(json.dumps(item, ensure_ascii=False)+'\n')
-                fout.flush()
-            except Exception as e:
-                print(e)
-
-
-def seed_everything(seed):
-    torch.manual_seed(seed)
-    torch.cuda.manual_seed(seed)
-    np.random.seed(seed)
-    random.seed(seed)
-    torch.backends.cudnn.benchmark = False
-    torch.backends.cudnn.deterministic = True
-    torch.cuda.manual_seed_all(seed)
+from runner import GPT_MODEL, DEFAULT_CONCURRENCY, get_response_gpt4, run_concurrently
+# runner puts app/ on sys.path
+from utils.openai_utils import run_async
+from batch import chat_request, run_batch
+from output_sink import JsonlSink
 
+async def get_pred(item, max_new_tokens, sink, template):
+    prompt = item['prompt']
+    prompt = template.replace('$INST$', prompt)
+    try:
+        response = await get_response_gpt4(prompt, max_new_tokens)
+        item["plan"] = response
+        sink.write(item)
+    except Exception as e:
+        print(e)
 
-def get_pred(rank, world_size, data, max_new_tokens, out_file, template):
-    with open(out_file, 'a', encoding='utf-8') as fout:
-        for item in tqdm(data):
-            prompt = item['prompt']
-            prompt = template.replace('$INST$', prompt)
-            try:
-                response = get_response_gpt4(prompt, max_new_tokens)
-                item["plan"] = response
-                fout.write(json.dumps(item, ensure_ascii=False)+'\n')
-                fout.flush()
-            except Exception as e:
-                print(e)
+def run_batch_pred(data, max_new_tokens, sink, template, wait=True, poll_interval=30):
+    items = {hashlib.sha256(item['prompt'].encode('utf-8')).hexdigest(): item for item in data}
+    requests = [
+        chat_request(custom_id, GPT_MODEL, template.replace('$INST$', item['prompt']), max_new_tokens)
+        for custom_id, item in items.items()
+    ]
+    results = run_batch(requests, 'plan_batch_state.json', wait=wait, poll_interval=poll_interval)
+    if results is None:
+        return
+    for custom_id, item in items.items():
+        if custom_id in results:
+            item["plan"] = results[custom_id]
+            sink.write(item)
 
 if __name__ == '__main__':
     # input format: {"prompt": "xxx", ...}
     # output format: {"prompt": "xxx", "plan": "xxx", ...}    
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help='Maximum number of requests in flight')
+    parser.add_argument('--batch', action='store_true', help='Use the OpenAI Batch API instead of live requests')
+    parser.add_argument('--no-wait', action='store_true', help='Submit or check the batch and exit; run again to collect the results')
+    parser.add_argument('--poll-interval', type=int, default=30, help='Seconds between batch status checks')
+    args = parser.parse_args()
+
     in_file = 'instructions.jsonl'
     out_file = 'plan.jsonl'
-    seed_everything(42)
     max_new_tokens = 4096
-    world_size = 8
-    has_data = {}
-
-    if os.path.exists(out_file):
-        with open(out_file, encoding='utf-8') as f:
-            has_data = {json.loads(line)["prompt"]: 0 for line in f}
-
-    data = []
-    with open(in_file, encoding='utf-8') as f:
-        for line in f:
-            item = json.loads(line)
-            if item["prompt"] not in has_data:
-                data.append(item)
-
-    template = open('prompts/plan.txt', encoding='utf-8').read()
-    data_subsets = [data[i::world_size] for i in range(world_size)]
-    processes = []
 
-    for rank in range(world_size):
-        p = mp.Process(target=get_pred, args=(rank, world_size, data_subsets[rank], max_new_tokens, out_file, template))
-        p.start()
-        processes.append(p)
+    with JsonlSink(out_file) as sink:
+        data = []
+        with open(in_file, encoding='utf-8') as f:
+            for line in f:
+                item = json.loads(line)
+                if not sink.is_done(item["prompt"]):
+                    data.append(item)
 
-    for p in processes:
-        p.join()
+        template = open('prompts/plan.txt', encoding='utf-8').read()
+        if args.batch:
+            run_batch_pred(data, max_new_tokens, sink, template, wait=not args.no_wait, poll_interval=args.poll_interval)
+        else:
+            run_async(run_concurrently(
+                data,
+                lambda item: get_pred(item, max_new_tokens, sink, template),
+                args.concurrency
+            ))
@@ -1,11 +1,17 @@
 import os
+import sys
 import json
 import requests
 import wave
 import tempfile
-from pydub import AudioSegment
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from utils.openai_utils import get_http_session
+from utils.rate_limiter import call_with_retries
+from utils.audio_assembler import AudioAssembler
+from utils.tts_cache import cached_tts
+
 # Load OpenAI API Key
 load_dotenv()
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
@@ -82,15 +88,22 @@ def generate_tts_chunks(chunks, voice):
             "input": chunk
         }
 
-        response = requests.post(url, headers=headers, json=data)
+        def post():
+            response = get_http_session().post(url, headers=headers, json=data)
+            response.raise_for_status()
+            return response
+
+        try:
+            # Chunks rendered before with the same voice come from the TTS cache
+            content = cached_tts(f"openai:{voice}", "tts-1", chunk, lambda: call_with_retries(post, "tts-1").content)
+        except requests.HTTPError as e:
+            print(f"❌ Error in TTS Generation for chunk {i+1}: {e.response.text}")
+            continue
 
-        if response.status_code == 200:
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".mp3")
-            with open(temp_file.name, "wb") as f:
-                f.write(response.content)
-            temp_files.append(temp_file.name)
-        else:
-            print(f"❌ Error in TTS Generation for chunk {i+1}: {response.text}")
+        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".mp3")
+        with open(temp_file.name, "wb") as f:
+            f.write(content)
+        temp_files.append(temp_file.name)
 
     return temp_files
 
@@ -99,10 +112,9 @@ def merge_audio_files(audio_files, output_file):
     """Merges multiple MP3 files into a single MP3 file."""
     print("\n🎼 Merging audio files into one MP3...")
 
-    combined_audio = AudioSegment.empty()
+    combined_audio = AudioAssembler()
     for file in audio_files:
-        segment = AudioSegment.from_mp3(file)
-        combined_audio += segment
+        combined_audio.append_file(file, format="mp3")
 
     combined_audio.export(output_file, format="mp3")
     print(f"✅ Final Audio saved as {output_file}")
@@ -0,0 +1,89 @@
+"""
+Single-process asyncio runner for the agentwrite scripts.
+
+The scripts only make HTTP calls, so instead of one OS process per worker they keep up
+to --concurrency requests in flight on one event loop, limited by the API budgets in
+config.yaml (see utils.rate_limiter) rather than by the number of processes.
+"""
+import os
+import sys
+import asyncio
+from tqdm import tqdm
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from utils.config import get_setting
+from utils.openai_utils import get_async_openai_client
+from utils.llm_cache import make_cache_key, lookup_completion, store_completion
+from utils.rate_limiter import acall_with_retries, estimate_request_tokens, get_rate_limiter, get_all_metrics
+from utils.model_routing import get_route, timed_call, with_route_timeout, get_latency_metrics
+
+# Model and timeout of the agentwrite route in the profile picked by MODEL_PROFILE
+# (or routing.profile in config.yaml), see utils.model_routing
+ROUTE = get_route("agentwrite")
+GPT_MODEL = ROUTE["model"]
+DEFAULT_CONCURRENCY = get_setting("agentwrite", "concurrency", 200)
+
+async def get_response_gpt4(prompt, max_new_tokens=1024, temperature=1.0, stop=None, use_cache=True):
+    messages = [
+        {'role': 'user', 'content': prompt},
+    ]
+    cache_key = make_cache_key(GPT_MODEL, messages, temperature=temperature, max_tokens=max_new_tokens, stop=stop)
+    if use_cache:
+        # The cache does blocking (possibly remote) I/O, keep it off the event loop
+        cached = await asyncio.to_thread(lookup_completion, cache_key)
+        if cached is not None:
+            return cached
+
+    client = with_route_timeout(get_async_openai_client(pool_size=DEFAULT_CONCURRENCY), ROUTE)
+    async def attempt():
+        with timed_call(ROUTE):
+            return await client.chat.completions.create(
+                model=GPT_MODEL,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_new_tokens,
+                stop=stop,
+            )
+
+    tokens = estimate_request_tokens(GPT_MODEL, messages, max_new_tokens)
+    try:
+        completion = await acall_with_retries(
+            attempt,
+            GPT_MODEL,
+            tokens,
+            max_attempts=10
+        )
+    except Exception as e:
+        if "maximum context length" in str(e):
+            raise e
+        elif "triggering" in str(e):
+            return 'Trigger OpenAI\'s content management policy'
+        print("Error Occurs: \"%s\"" % str(e))
+        print("Max tries. Failed.")
+        return "Max tries. Failed."
+
+    if completion.usage:
+        get_rate_limiter(GPT_MODEL).release(tokens, completion.usage.total_tokens)
+    content = completion.choices[0].message.content or ''
+    if use_cache and content:
+        await asyncio.to_thread(store_completion, cache_key, content)
+    return content
+
+async def run_concurrently(items, worker, concurrency=DEFAULT_CONCURRENCY):
+    """
+    Runs await worker(item) for every item with at most `concurrency` in flight.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    progress = tqdm(total=len(items))
+
+    async def run(item):
+        async with semaphore:
+            try:
+                await worker(item)
+            finally:
+                progress.update(1)
+
+    await asyncio.gather(*(run(item) for item in items))
+    progress.close()
+    print(get_all_metrics())
+    print(get_latency_metrics())
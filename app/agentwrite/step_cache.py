@@ -0,0 +1,95 @@
+"""
+On-disk cache of written steps for agentwrite/write.py.
+
+Responses are stored in SQLite in WAL mode, keyed by the hash of the prompt and the
+hash of the plan step, so lookups are single index reads and several runs can read and
+write the same cache at once. Nothing is loaded up front, so startup time and memory
+do not depend on the size of the cache.
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+
+def _hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+class StepCache:
+    def __init__(self, path='write_cache.sqlite', legacy_jsonl='write_cache.jsonl'):
+        """
+        Opens (or creates) the cache at path. If a write_cache.jsonl from earlier runs
+        exists next to a new cache, it is imported once and renamed to *.imported.
+        """
+        is_new = not os.path.exists(path)
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS steps ('
+            ' prompt_hash TEXT NOT NULL,'
+            ' step_hash TEXT NOT NULL,'
+            ' response TEXT NOT NULL,'
+            ' created REAL NOT NULL,'
+            ' PRIMARY KEY (prompt_hash, step_hash)'
+            ') WITHOUT ROWID'
+        )
+        if is_new and legacy_jsonl and os.path.exists(legacy_jsonl):
+            self.import_jsonl(legacy_jsonl)
+            os.replace(legacy_jsonl, legacy_jsonl + '.imported')
+
+    def get(self, prompt, step):
+        """
+        Returns the cached response for the step of the prompt, or None.
+        """
+        row = self.conn.execute(
+            'SELECT response FROM steps WHERE prompt_hash = ? AND step_hash = ?',
+            (_hash(prompt), _hash(step))
+        ).fetchone()
+        return row[0] if row else None
+
+    def put(self, prompt, step, response):
+        self.conn.execute(
+            'INSERT OR REPLACE INTO steps VALUES (?, ?, ?, ?)',
+            (_hash(prompt), _hash(step), response, time.time())
+        )
+
+    def import_jsonl(self, path):
+        """
+        Imports the {"prompt", "step", "response"} lines of a write_cache.jsonl file.
+        """
+        count = 0
+        with open(path, encoding='utf-8') as f:
+            self.conn.execute('BEGIN')
+            try:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    item = json.loads(line)
+                    self.conn.execute(
+                        'INSERT OR REPLACE INTO steps VALUES (?, ?, ?, ?)',
+                        (_hash(item['prompt']), _hash(item['step']), item['response'], time.time())
+                    )
+                    count += 1
+                self.conn.execute('COMMIT')
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+        print(f"Imported {count} cached steps from {path}")
+
+    def compact(self, keep_prompts=None):
+        """
+        Drops the steps of prompts not in keep_prompts (if given), folds the WAL back into
+        the database and reclaims the free space.
+        """
+        if keep_prompts is not None:
+            self.conn.execute('CREATE TEMP TABLE keep (prompt_hash TEXT PRIMARY KEY) WITHOUT ROWID')
+            self.conn.executemany('INSERT OR IGNORE INTO keep VALUES (?)', ((_hash(prompt),) for prompt in keep_prompts))
+            deleted = self.conn.execute('DELETE FROM steps WHERE prompt_hash NOT IN (SELECT prompt_hash FROM keep)').rowcount
+            self.conn.execute('DROP TABLE keep')
+            print(f"Dropped {deleted} cached steps")
+        self.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        self.conn.execute('VACUUM')
+
+    def close(self):
+        self.conn.close()
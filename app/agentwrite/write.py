@@ -1,153 +1,135 @@
-import requests
-import time, os, json
-from transformers import AutoTokenizer, AutoModelForCausalLM
-import torch
-import numpy as np
-import random
-import codecs
+import json
+import hashlib
 import argparse
-from copy import deepcopy
-from tqdm import tqdm
-import traceback
-import re
-import torch.distributed as dist
-import torch.multiprocessing as mp
 from dotenv import load_dotenv
 load_dotenv()
 
-GPT4_API_KEY = os.getenv('OPENAI_API_KEY')
-GPT_MODEL = 'gpt-4o-2024-05-13'
-def get_response_gpt4(prompt, max_new_tokens=1024, temperature=1.0, stop=None):
-    tries = 0
-    while tries < 10:
-        tries += 1
-        try:
-            headers = {
-                'Authorization': "Bearer {}".format(GPT4_API_KEY),
-            }
-            messages = [
-                {'role': 'user', 'content': prompt},
-            ]
-            resp = requests.post("https://api.openai.com/v1/chat/completions", json = {
-                "model": GPT_MODEL,
-                "messages": messages,
-                "temperature": temperature,
-                "max_tokens": max_new_tokens,
-                "stop": stop,
-            }, headers=headers, timeout=600)
-            if resp.status_code != 200:
-                raise Exception(resp.text)
-            resp = resp.json()
-            break
-        except KeyboardInterrupt as e:
-            raise e
-        except Exception as e:
-            if "maximum context length" in str(e):
-                raise e
-            elif "triggering" in str(e):
-                return 'Trigger OpenAI\'s content management policy'
-            print("Error Occurs: \"%s\"        Retry ..."%(str(e)))
-    else:
-        print("Max tries. Failed.")
-        return "Max tries. Failed."
-    try:
-        return resp["choices"][0]["message"]["content"]
-    except: 
-        return ''
-
-def get_pred(rank, world_size, data, max_new_tokens, out_file, template, cache_file, cache_dict):
-    with open(out_file, 'a', encoding='utf-8') as fout, open(cache_file, 'a', encoding='utf-8') as cache_fout:
-        for item in tqdm(data):
-            try:
-                inst = item['prompt']
-                plan = item['plan'].strip().replace('\n\n', '\n')
-                steps = plan.split('\n')
-                text = ""
-                responses = []
-
-                if len(steps) > 50:
-                    print(plan)
-                    continue
-
-                for step in steps:
-                    if inst in cache_dict and step in cache_dict[inst]:
-                        response = cache_dict[inst][step]
-                        responses.append(response)
-                        text += response + '\n\n'
-                        continue
-
-                    prompt = template.replace('$INST$', inst).replace('$PLAN$', plan.strip()).replace('$TEXT$', text.strip()).replace('$STEP$', step.strip())
-                    response = get_response_gpt4(prompt, max_new_tokens)
-                    if response == '':
-                        break
-
-                    # Save to cache
-                    cache_fout.write(json.dumps({"prompt": inst, "step": step, "response": response}, ensure_ascii=False) + '\n')
-                    cache_fout.flush()
-
-                    responses.append(response)
-                    text += response + '\n\n'
-
-                if response == '':
-                    continue
+from runner import GPT_MODEL, DEFAULT_CONCURRENCY, get_response_gpt4, run_concurrently
+# runner puts app/ on sys.path
+from utils.openai_utils import run_async
+from batch import chat_request, run_batch
+from step_cache import StepCache
+from output_sink import JsonlSink
 
+async def get_pred(item, max_new_tokens, sink, template, cache):
+    try:
+        inst = item['prompt']
+        plan = item['plan'].strip().replace('\n\n', '\n')
+        steps = plan.split('\n')
+        text = ""
+        responses = []
+
+        if len(steps) > 50:
+            print(plan)
+            return
+
+        for step in steps:
+            response = cache.get(inst, step)
+            if response is not None:
+                responses.append(response)
+                text += response + '\n\n'
+                continue
+
+            prompt = template.replace('$INST$', inst).replace('$PLAN$', plan.strip()).replace('$TEXT$', text.strip()).replace('$STEP$', step.strip())
+            response = await get_response_gpt4(prompt, max_new_tokens)
+            if response == '':
+                break
+
+            # Save to cache
+            cache.put(inst, step, response)
+
+            responses.append(response)
+            text += response + '\n\n'
+
+        if response == '':
+            return
+
+        item["write"] = responses
+        sink.write(item)
+        
+    except Exception as e:
+        print(e)
+
+def run_batch_pred(data, max_new_tokens, sink, template, cache, wait=True, poll_interval=30):
+    # Each step depends on the text written so far, so every round submits the next
+    # missing step of every pending item and merges the results into the cache.
+    pending = {hashlib.sha256(item['prompt'].encode('utf-8')).hexdigest(): item for item in data}
+    while pending:
+        requests = []
+        for item_id, item in list(pending.items()):
+            inst = item['prompt']
+            plan = item['plan'].strip().replace('\n\n', '\n')
+            steps = plan.split('\n')
+            if len(steps) > 50:
+                print(plan)
+                del pending[item_id]
+                continue
+
+            responses = [cache.get(inst, step) for step in steps]
+            if None not in responses:
                 item["write"] = responses
-                fout.write(json.dumps(item, ensure_ascii=False) + '\n')
-                fout.flush()
-                
-            except Exception as e:
-                print(e)
-
-def seed_everything(seed):
-    torch.manual_seed(seed)
-    torch.cuda.manual_seed(seed)
-    np.random.seed(seed)
-    random.seed(seed)
-    torch.backends.cudnn.benchmark = False
-    torch.backends.cudnn.deterministic = True
-    torch.cuda.manual_seed_all(seed)
+                sink.write(item)
+                del pending[item_id]
+                continue
+
+            step_index = responses.index(None)
+            text = ''.join(response + '\n\n' for response in responses[:step_index])
+            prompt = template.replace('$INST$', inst).replace('$PLAN$', plan.strip()).replace('$TEXT$', text.strip()).replace('$STEP$', steps[step_index].strip())
+            requests.append(chat_request(f"{item_id}-{step_index}", GPT_MODEL, prompt, max_new_tokens))
 
+        if not requests:
+            break
+
+        results = run_batch(requests, 'write_batch_state.json', wait=wait, poll_interval=poll_interval)
+        if results is None:
+            return
+
+        for request in requests:
+            item_id, step_index = request["custom_id"].rsplit('-', 1)
+            item = pending[item_id]
+            response = results.get(request["custom_id"], '')
+            if response == '':
+                # Failed or empty steps are retried by the next run
+                del pending[item_id]
+                continue
+            step = item['plan'].strip().replace('\n\n', '\n').split('\n')[int(step_index)]
+            cache.put(item['prompt'], step, response)
 
 if __name__ == '__main__':
     # input format: {"prompt": "xxx", "plan": "xxx", ...}
     # output format: {"prompt": "xxx", "plan": "xxx", "write": [...], ...}    
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help='Maximum number of requests in flight')
+    parser.add_argument('--batch', action='store_true', help='Use the OpenAI Batch API instead of live requests')
+    parser.add_argument('--no-wait', action='store_true', help='Submit or check the current batch round and exit; run again to continue')
+    parser.add_argument('--poll-interval', type=int, default=30, help='Seconds between batch status checks')
+    parser.add_argument('--compact-cache', action='store_true', help='Drop cached steps of finished prompts, shrink the cache and exit')
+    args = parser.parse_args()
+
     in_file = 'plan.jsonl'
     out_file = 'write.jsonl'
-    cache_file = 'write_cache.jsonl'
+    cache_file = 'write_cache.sqlite'
     
-    seed_everything(42)
     max_new_tokens = 4096
-    world_size = 8
-    has_data = {}
 
-    if os.path.exists(out_file):
-        with open(out_file, encoding='utf-8') as f:
-            has_data = {json.loads(line)["prompt"]: 0 for line in f}
+    cache = StepCache(cache_file)
 
-    cache_dict = {}
-    if os.path.exists(cache_file):
-        with open(cache_file, encoding='utf-8') as f:
+    with JsonlSink(out_file) as sink:
+        data = []
+        with open(in_file, encoding='utf-8') as f:
             for line in f:
                 item = json.loads(line)
-                if item["prompt"] not in cache_dict:
-                    cache_dict[item["prompt"]] = {}
-                cache_dict[item["prompt"]][item["step"]] = item["response"]
-
-    data = []
-    with open(in_file, encoding='utf-8') as f:
-        for line in f:
-            item = json.loads(line)
-            if item["prompt"] not in has_data:
-                data.append(item)
-
-    template = open('prompts/write.txt', encoding='utf-8').read()
-    data_subsets = [data[i::world_size] for i in range(world_size)]
-    
-    processes = []
-    for rank in range(world_size):
-        p = mp.Process(target=get_pred, args=(rank, world_size, data_subsets[rank], max_new_tokens, out_file, template, cache_file, cache_dict))
-        p.start()
-        processes.append(p)
-
-    for p in processes:
-        p.join()
+                if not sink.is_done(item["prompt"]):
+                    data.append(item)
+
+        template = open('prompts/write.txt', encoding='utf-8').read()
+        if args.compact_cache:
+            cache.compact(keep_prompts=(item["prompt"] for item in data))
+        elif args.batch:
+            run_batch_pred(data, max_new_tokens, sink, template, cache, wait=not args.no_wait, poll_interval=args.poll_interval)
+        else:
+            run_async(run_concurrently(
+                data,
+                lambda item: get_pred(item, max_new_tokens, sink, template, cache),
+                args.concurrency
+            ))
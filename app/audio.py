@@ -1,21 +1,67 @@
 import os
+import base64
 import streamlit as st
-from utils.audio_generator import generate_audio, list_voices
+import streamlit.components.v1 as components
+from utils.audio_generator import generate_audio, list_voices, PreviewStream, PREVIEW_SAMPLE_RATE
 
-def on_preview_audio(conversation, selected_voice_1, selected_voice_2):
-    with st.spinner("Generating preview audio..."):
-        preview_audio_path = generate_audio(conversation, selected_voice_1, selected_voice_2, preview=True)
+def _utterance_progress(label):
+    progress = st.progress(0.0, text=label)
+    return lambda done, total: progress.progress(done / total, text=f"{label} {done}/{total} utterances")
 
-        if not preview_audio_path:
-            st.error("⚠️ Error: `generate_audio` failed to generate preview audio.")
-            return
+# Plays the growing PCM buffer of a PreviewStream, see components/preview_player
+_preview_player = components.declare_component(
+    "preview_player",
+    path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "preview_player")
+)
+# How often the player is handed new audio while the preview is still rendering
+PREVIEW_POLL_SECONDS = 0.25
+
+def start_preview(conversation, selected_voice_1, selected_voice_2):
+    """
+    Starts rendering the preview in the background, replacing the previous one.
+    """
+    previous = st.session_state.get("preview_stream")
+    if previous is not None:
+        previous.cancel()
+    stream = PreviewStream(conversation, selected_voice_1, selected_voice_2)
+    st.session_state["preview_stream"] = stream
+    st.session_state["preview_polling"] = stream.id
 
-        st.session_state["preview_audio_path"] = preview_audio_path
-        st.success(f"✅ Preview audio generated: {preview_audio_path}")
+def render_preview_player():
+    """
+    Renders the single preview player and hands it the audio it does not hold yet.
+    Runs as a fragment every PREVIEW_POLL_SECONDS while the preview is rendering, and
+    reruns the app once it is complete to stop polling.
+    """
+    stream = st.session_state["preview_stream"]
+    acknowledged = st.session_state.get("preview_player") or {}
+    start = acknowledged.get("received", 0) if acknowledged.get("stream_id") == stream.id else 0
+    data, finished = stream.read(start)
+    _preview_player(
+        stream_id=stream.id,
+        sample_rate=PREVIEW_SAMPLE_RATE,
+        start=start,
+        data=base64.b64encode(data).decode("ascii"),
+        finished=finished,
+        key="preview_player",
+        default=None
+    )
+    if finished and stream.error:
+        st.error(f"⚠️ Error: {stream.error}")
+    if finished and st.session_state.get("preview_polling") == stream.id:
+        st.session_state["preview_polling"] = None
+        st.rerun()
 
 def on_full_audio(conversation, selected_voice_1, selected_voice_2):
     with st.spinner("Generating full audio..."):
-        full_audio_path = generate_audio(conversation, selected_voice_1, selected_voice_2, preview=False)
+        try:
+            full_audio_path = generate_audio(
+                conversation, selected_voice_1, selected_voice_2, preview=False,
+                on_utterance_done=_utterance_progress("Voicing conversation...")
+            )
+        except RuntimeError as e:
+            st.error(f"⚠️ Error: {e}")
+            return
 
         if not full_audio_path:
             st.error("⚠️ Error: `generate_audio` failed to generate full audio.")
@@ -41,7 +87,7 @@ def render_audio_section():
         st.button(
             "Generate Preview Audio",
             key="preview_audio_button",
-            on_click=on_preview_audio,
+            on_click=start_preview,
             args=(st.session_state["conversation"], selected_voice_1, selected_voice_2),
         )
 
@@ -52,11 +98,9 @@ def render_audio_section():
             args=(st.session_state["conversation"], selected_voice_1, selected_voice_2),
         )
 
-    if "preview_audio_path" in st.session_state:
-        if os.path.exists(st.session_state["preview_audio_path"]) and os.path.getsize(st.session_state["preview_audio_path"]) > 0:
-            st.audio(st.session_state["preview_audio_path"], format="audio/mp3")
-        else:
-            st.error("⚠️ Error: Preview audio file is missing or empty.")
+        if "preview_stream" in st.session_state:
+            polling = st.session_state.get("preview_polling") == st.session_state["preview_stream"].id
+            st.fragment(render_preview_player, run_every=PREVIEW_POLL_SECONDS if polling else None)()
 
     if "full_audio_path" in st.session_state:
         if os.path.exists(st.session_state["full_audio_path"]) and os.path.getsize(st.session_state["full_audio_path"]) > 0:
@@ -3,10 +3,23 @@ import os
 from utils.data_models import Conversation, Monologue
 import streamlit as st
 from pydantic import TypeAdapter
-from utils.context_prompts_handler import create_context_and_prompts
-from utils.llm_calls import fetch_conversation_responses, fetch_fake_conversation_responses
+from utils.context_prompts_handler import create_context_and_segment_prompts
+from utils.llm_calls import (
+    fetch_conversation_responses,
+    fetch_conversation_responses_concurrently,
+    stream_conversation_responses,
+    fetch_fake_conversation_responses
+)
 from utils.conversation_generator import merge_conversation
 from utils.token_estimator import TokenEstimator
+from utils.segment_planner import plan_segments, count_planned_calls
+from utils.config import get_setting
+from utils.audio_generator import VoicingPipeline, list_speaker_voices
+from utils.length_controller import get_length_controller
+from utils.section_fingerprints import find_reusable_segments, store_section_segments
+from utils.model_routing import get_route
+
+GENERATION_MODES = ["Concurrent", "Streaming", "Serial"]
 
 def generate_conversation_button_callback():
     outline = st.session_state["outline"]
@@ -17,35 +30,127 @@ def generate_conversation_button_callback():
             outline
         )
     else:
-        estimator = TokenEstimator()
-        num_splits = estimator.estimate_conversation_splits(outline.length_minutes)
-        tokens_per_split = estimator.get_tokens_per_split(outline.length_minutes, num_splits)
-        
-        splits_info = {
-            "total_splits": num_splits,
-            "tokens_per_split": tokens_per_split,
+        mode = st.session_state.get("generation_mode", GENERATION_MODES[0])
+        pipeline = create_voicing_pipeline(outline)
+        model = get_route("conversation_segment")["model"]
+        # Plan with the measured writing and speaking rates instead of the assumed ones
+        estimator = get_length_controller().calibrate(
+            TokenEstimator(), model, voices=list(pipeline.voice_mapping.values()) if pipeline else None
+        )
+        segments = plan_segments(outline, estimator)
+        use_cache = st.session_state.get("use_llm_cache", True)
+
+        # Sections whose inputs are unchanged since they were last generated are reused as they are,
+        # unless "Reuse cached LLM responses" is unticked to force a fresh generation
+        segment_store = st.session_state.setdefault("section_segments", {})
+        document_context = st.session_state.get("document_context")
+        reused_segments = find_reusable_segments(segment_store, outline, segments, document_context, model) if use_cache else {}
+        new_segments = [segment for i, segment in enumerate(segments) if i not in reused_segments]
+
+        st.session_state["conversation_splits"] = {
+            "total_splits": len(segments),
             "current_split": 0,
-            "num_speakers": outline.num_speakers
+            "num_speakers": outline.num_speakers,
+            "tokens_per_word": estimator.tokens_per_word
         }
-        st.session_state["conversation_splits"] = splits_info
+        st.info(
+            f"Planned {len(segments)} segments for {len(outline.sections)} sections, "
+            f"reusing {len(reused_segments)} unchanged "
+            f"({count_planned_calls(new_segments, mode == 'Concurrent', get_setting('generation', 'self_summarize', True))} LLM calls)"
+        )
 
-        all_conversation_pieces = []
         progress_bar = st.progress(0)
+        context, prompts = create_context_and_segment_prompts(outline, segments)
+        on_segment_ready = pipeline.add_segment if pipeline else None
 
-        for split_num in range(splits_info["total_splits"]):
-            splits_info["current_split"] = split_num
-            st.session_state["conversation_splits"] = splits_info
-            progress = (split_num + 1) / splits_info["total_splits"]
-            progress_bar.progress(progress)
+        if mode == "Streaming":
+            conversation_pieces = render_streamed_conversation(
+                context, prompts, outline, segments, progress_bar, use_cache, on_segment_ready, reused_segments
+            )
+        else:
+            fetch_responses = fetch_conversation_responses_concurrently if mode == "Concurrent" else fetch_conversation_responses
+            conversation_pieces = fetch_responses(
+                context,
+                prompts,
+                outline,
+                segments=segments,
+                on_segment_done=lambda done, total: progress_bar.progress(done / total),
+                use_cache=use_cache,
+                on_segment_ready=on_segment_ready,
+                reused_segments=reused_segments
+            )
 
-            context, prompts = create_context_and_prompts(outline)
-            conversation_pieces = fetch_conversation_responses(context, prompts, outline)
-            all_conversation_pieces.extend(conversation_pieces)
+        store_section_segments(segment_store, outline, segments, conversation_pieces, document_context, model)
+        st.session_state["conversation"] = merge_conversation(conversation_pieces, outline)
+        progress_bar.empty()
 
-            st.info(f"Generated part {split_num + 1} of {splits_info['total_splits']}")
+        if pipeline:
+            with st.spinner("Finishing audio..."):
+                try:
+                    full_audio_path = pipeline.finish(st.session_state["conversation"].utterances)
+                except RuntimeError as e:
+                    st.error(f"⚠️ Error: {e}")
+                    full_audio_path = None
+            if full_audio_path:
+                st.session_state["full_audio_path"] = full_audio_path
 
-        st.session_state["conversation"] = merge_conversation(all_conversation_pieces, outline)
-        progress_bar.empty()
+def create_voicing_pipeline(outline):
+    """
+    Returns a VoicingPipeline for the voices chosen in the conversation section, or None
+    unless "Voice while generating" is ticked.
+    """
+    if not st.session_state.get("voice_while_generating"):
+        return None
+    voice_mapping = {}
+    for i, speaker in enumerate(outline.speakers[:2]):
+        voice = st.session_state.get(f"pipeline_voice_{i + 1}")
+        if voice:
+            voice_mapping[speaker.name] = voice
+    return VoicingPipeline(voice_mapping) if voice_mapping else None
+
+def render_voicing_options(outline):
+    """
+    Renders the "Voice while generating" option and the voice for each speaker.
+    """
+    st.checkbox(
+        "🎙️ Voice while generating",
+        key="voice_while_generating",
+        help="Send every finished segment to text-to-speech while the next ones are still being written."
+    )
+    if st.session_state.get("voice_while_generating"):
+        voice_options = list_speaker_voices(outline.speakers[:2])
+        for i, (speaker, options) in enumerate(zip(outline.speakers[:2], voice_options)):
+            if options:
+                st.selectbox(f"Voice for {speaker.name}", options, key=f"pipeline_voice_{i + 1}")
+
+def render_streamed_conversation(context, prompts, outline, segments, progress_bar, use_cache, on_segment_ready=None, reused_segments=None):
+    """
+    Renders every utterance as soon as it has been generated and returns the conversation pieces.
+    on_segment_ready(index, utterances) is called as soon as a segment is complete.
+    """
+    outline_dict = outline.model_dump()
+    final_format = Monologue if outline.num_speakers == 1 else Conversation
+    conversation_pieces = [final_format(outline=outline_dict, utterances=[]) for _ in prompts]
+
+    container = st.container(height=300)
+    current_segment = 0
+    for segment_index, utterance in stream_conversation_responses(
+        context, prompts, outline, segments=segments, use_cache=use_cache, reused_segments=reused_segments
+    ):
+        if on_segment_ready and segment_index > current_segment:
+            # Segments are streamed in order, so every earlier segment is complete
+            for finished in range(current_segment, segment_index):
+                on_segment_ready(finished, conversation_pieces[finished].utterances)
+            current_segment = segment_index
+        conversation_pieces[segment_index].utterances.append(utterance)
+        container.markdown(f"**{utterance.speaker.name}:** {utterance.text}")
+        progress_bar.progress(segment_index / len(prompts))
+
+    if on_segment_ready:
+        for finished in range(current_segment, len(prompts)):
+            on_segment_ready(finished, conversation_pieces[finished].utterances)
+
+    return conversation_pieces
 
 def render_conversation_upload_section():
     uploaded_file = st.file_uploader("Upload Conversation JSON", type="json", key="upload_conversation")
@@ -80,6 +185,20 @@ def render_conversation_section():
     if "outline" in st.session_state:
         output_type = "Monologue" if st.session_state["outline"].num_speakers == 1 else "Conversation"
         st.header(f"🗣️ {output_type} Generation")
+        default_mode = get_setting("generation", "mode", "concurrent").capitalize()
+        st.radio(
+            "Generation mode",
+            GENERATION_MODES,
+            index=GENERATION_MODES.index(default_mode) if default_mode in GENERATION_MODES else 0,
+            key="generation_mode",
+            horizontal=True,
+            help=(
+                "Concurrent drafts all segments in parallel, using the outline for continuity. "
+                "Streaming shows every utterance as soon as it is written. "
+                "Serial generates one segment at a time."
+            )
+        )
+        render_voicing_options(st.session_state["outline"])
         if st.button(f"Generate {output_type}"):
             with st.spinner(f"Generating {output_type.lower()}..."):
                 generate_conversation_button_callback()
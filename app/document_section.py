@@ -1,18 +1,17 @@
 import streamlit as st
 from utils.document_handler import upload_and_process_document
-from utils.vector_store import VectorStore
-import numpy as np
 
 def render_document_section():
     with st.sidebar.expander("📚 Document Management", expanded=False):
-        if "vector_store" not in st.session_state:
-            st.session_state["vector_store"] = VectorStore()
-
         chunks = upload_and_process_document()
 
         if chunks and st.button("Process Document"):
             with st.spinner("Processing document..."):
                 try:
+                    if "vector_store" not in st.session_state:
+                        # Imported here so faiss and sentence_transformers are only loaded when needed
+                        from utils.vector_store import VectorStore
+                        st.session_state["vector_store"] = VectorStore()
                     st.session_state["vector_store"].create_index(chunks)
                     st.success("Document processed and indexed successfully!")
                 except Exception as e:
@@ -5,6 +5,8 @@ from conversation import render_conversation_section
 from audio import render_audio_section
 from text_to_image import render_image_generation_section
 from document_section import render_document_section
+from utils.rate_limiter import get_all_metrics
+from utils.model_routing import PROFILES, active_profile, get_latency_metrics
 
 # Custom CSS for styling
 st.markdown("""
@@ -26,8 +28,21 @@ st.sidebar.image(logo_path, use_container_width=True)
 authenticated = handle_authentication()
 
 if authenticated:
+    st.sidebar.checkbox("♻️ Reuse cached LLM responses", value=True, key="use_llm_cache")
+    st.sidebar.selectbox(
+        "🧭 Model profile",
+        PROFILES,
+        index=PROFILES.index(active_profile()) if active_profile() in PROFILES else 1,
+        key="model_profile",
+        help="Which model, token budget and timeout every call site uses (routing in config.yaml)"
+    )
     render_document_section()
     render_outline_section()
     render_conversation_section()
     render_audio_section()
     render_image_generation_section()
+
+    with st.sidebar.expander("📈 API Scheduler", expanded=False):
+        st.json(get_all_metrics())
+        st.caption("Latency per call site")
+        st.json(get_latency_metrics())
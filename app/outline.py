@@ -5,10 +5,17 @@ import streamlit as st
 from pydantic import TypeAdapter
 from utils.outline_generator import (
     generate_outline, 
+    generate_outline_two_phase,
     generate_fake_outline, 
     generate_outline_prompt, 
-    generate_outline_update_prompt
+    generate_outline_update_prompt,
+    generate_outline_patch_prompt,
+    generate_outline_patch
 )
+from utils.outline_patch import apply_outline_patch, OutlinePatchError
+from utils.config import get_setting
+
+OUTLINE_MODES = ["Two-phase", "Single call"]
 
 def render_outline_upload_section():
     uploaded_outline_file = st.file_uploader("Upload Outline JSON", type="json", key="upload_outline")
@@ -46,6 +53,14 @@ def generate_outline_button_callback():
     with st.spinner("Generating outline..."):
         if os.environ.get("DEBUG_MODE", "False").lower() == "true":
             outline = generate_fake_outline(topic, length, num_speakers)
+        elif st.session_state.get("outline_mode", OUTLINE_MODES[0]) == "Two-phase":
+            outline = generate_outline_two_phase(
+                topic=topic,
+                length=length,
+                num_speakers=num_speakers,
+                document_context=document_context,
+                use_cache=st.session_state.get("use_llm_cache", True)
+            )
         else:
             print("DOC CONTEXT", document_context)
             outline_prompt = generate_outline_prompt(
@@ -55,18 +70,28 @@ def generate_outline_button_callback():
                 document_context=document_context
             )
             print("OUTLINE PROMPT", outline_prompt)
-            outline = generate_outline(outline_prompt)
+            outline = generate_outline(outline_prompt, use_cache=st.session_state.get("use_llm_cache", True))
         st.session_state["outline"] = outline
 
 def update_outline_button_callback():
     user_change_instructions = st.session_state.get("user_change_instructions", "")
     if "outline" in st.session_state:
+        use_cache = st.session_state.get("use_llm_cache", True)
         with st.spinner("Updating outline..."):
+            if get_setting("outline", "update_mode", "patch") == "patch":
+                # Only the changes come back from the LLM; untouched sections stay as they are
+                patch_prompt = generate_outline_patch_prompt(st.session_state["outline"], user_change_instructions)
+                patch = generate_outline_patch(patch_prompt, use_cache=use_cache)
+                try:
+                    st.session_state["outline"] = apply_outline_patch(st.session_state["outline"], patch)
+                    return
+                except OutlinePatchError as e:
+                    st.warning(f"Could not apply the outline changes ({e}), regenerating the whole outline instead.")
             change_prompt = generate_outline_update_prompt(
                 st.session_state["outline"], 
                 user_change_instructions
             )
-            updated_outline = generate_outline(change_prompt)
+            updated_outline = generate_outline(change_prompt, use_cache=use_cache)
             st.session_state["outline"] = updated_outline
 
 def render_outline_upload_section():
@@ -149,6 +174,15 @@ def render_outline_section():
             key="image_prompt_details", 
             height=100
         )
+        default_mode = "Single call" if get_setting("outline", "mode", "two_phase") == "single" else "Two-phase"
+        st.radio(
+            "Outline mode",
+            OUTLINE_MODES,
+            index=OUTLINE_MODES.index(default_mode),
+            key="outline_mode",
+            horizontal=True,
+            help="Two-phase drafts the sections first and then writes them in parallel; single call writes the whole outline at once."
+        )
         st.button("Generate Outline", 
                 key="generate_outline_button", 
                 on_click=generate_outline_button_callback)
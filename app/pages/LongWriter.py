@@ -13,6 +13,7 @@ from utils.video_builder import (
 from utils import persistence
 import json
 from utils.image_prompt_generator import generate_image_prompts_from_steps
+from utils.config import get_setting
 from auth import handle_authentication
 from utils.persistence import PersistedModel
 import typing
@@ -100,6 +101,14 @@ authenticated = handle_authentication()
 if authenticated:
 
     with st.sidebar:
+        st.checkbox("♻️ Reuse cached LLM responses", value=True, key="use_llm_cache")
+        st.checkbox(
+            "🗜️ Compact context for long stories",
+            value=get_setting("longwriter", "compact_context", True),
+            key="compact_context",
+            help="Write each paragraph from the last few paragraphs plus a running summary instead of the whole story so far."
+        )
+
         st.markdown("### 📂 Load a Story (Optional)")
         uploaded_json = st.file_uploader("Upload saved story (.json)", type=["json"])
 
@@ -131,11 +140,25 @@ if authenticated:
             with st.spinner("Generating story..."):
                 st.session_state.long_story.instruction = plan
                 persist()
-                story, plan_steps = generate_longwriter_output(plan)
-                st.session_state.long_story.story = story
-                st.session_state.long_story.plan_steps = plan_steps
-                persist()
-            st.success("🎉 Story generated!")
+                progress_bar = st.progress(0)
+                try:
+                    # Completed steps are checkpointed, so generating again resumes where this stopped
+                    story, plan_steps = generate_longwriter_output(
+                        plan,
+                        use_cache=st.session_state.use_llm_cache,
+                        compact_context=st.session_state.compact_context,
+                        on_step_done=lambda done, total: progress_bar.progress(done / total)
+                    )
+                except RuntimeError as e:
+                    story = None
+                    st.error(f"❌ {e}. Click Generate Story again to resume from the last completed step.")
+                progress_bar.empty()
+                if story is not None:
+                    st.session_state.long_story.story = story
+                    st.session_state.long_story.plan_steps = plan_steps
+                    persist()
+            if story is not None:
+                st.success("🎉 Story generated!")
 
     # If a story has been generated, show additional options
     if st.session_state.long_story.story:
@@ -158,7 +181,7 @@ if authenticated:
             with st.spinner("Generating DALL·E prompts and images..."):
                 from utils.image_prompt_generator import generate_image_prompts_from_steps
 
-                image_prompts = generate_image_prompts_from_steps(image_prompt, plan_steps)
+                image_prompts = generate_image_prompts_from_steps(image_prompt, plan_steps, use_cache=st.session_state.use_llm_cache)
                 st.session_state.long_story.image_prompts = image_prompts
                 persist()
 
@@ -1,17 +1,8 @@
 import os
 import time
+import multiprocessing
 import streamlit as st
-from multiprocessing import Process, Manager
 from utils.llm_calls import generate_images_with_dalle
-from multiprocessing import set_start_method
-
-# Ensure correct multiprocessing start method for MacOS
-set_start_method("fork", force=True)
-
-# Initialize shared dictionaries
-manager = Manager()
-results_dict = manager.dict()  # Shared dictionary for generated images
-stop_signal = manager.dict({"abort": False})  # Shared stop signal
 
 
 def generate_images_in_process(prompts, stop_signal, api_key, results_dict):
@@ -62,11 +53,14 @@ def render_image_generation_section():
                 st.error("Missing OpenAI API Key.")
                 return
 
-            manager = Manager()
+            # Use fork explicitly (the default on MacOS is spawn) without changing the
+            # global start method, and only start the manager process when it is needed
+            mp_context = multiprocessing.get_context("fork")
+            manager = mp_context.Manager()
             results_dict = manager.dict()
             stop_signal = manager.dict({"abort": False})
 
-            process = Process(
+            process = mp_context.Process(
                 target=generate_images_in_process,
                 args=(selected_prompts, stop_signal, api_key, results_dict)
             )
@@ -0,0 +1,72 @@
+from pydub import AudioSegment
+
+class AudioAssembler:
+    """
+    Joins audio clips in linear time.
+
+    AudioSegment + AudioSegment copies everything accumulated so far, so building a long
+    track clip by clip is quadratic. The assembler appends the raw PCM frames of every clip
+    to one growing buffer instead and encodes once, on export.
+
+    Clips are converted to the format of the first clip (or the one given), the same way
+    pydub syncs two segments before adding them. len() is the duration in milliseconds,
+    like AudioSegment.
+    """
+
+    def __init__(self, frame_rate=None, sample_width=None, channels=None):
+        self.frame_rate = frame_rate
+        self.sample_width = sample_width
+        self.channels = channels
+        self._frames = bytearray()
+
+    def append(self, audio_segment):
+        """
+        Appends the frames of an AudioSegment.
+        """
+        if self.frame_rate is None:
+            self.frame_rate = audio_segment.frame_rate
+        if self.sample_width is None:
+            self.sample_width = audio_segment.sample_width
+        if self.channels is None:
+            self.channels = audio_segment.channels
+        if audio_segment.frame_rate != self.frame_rate:
+            audio_segment = audio_segment.set_frame_rate(self.frame_rate)
+        if audio_segment.sample_width != self.sample_width:
+            audio_segment = audio_segment.set_sample_width(self.sample_width)
+        if audio_segment.channels != self.channels:
+            audio_segment = audio_segment.set_channels(self.channels)
+        self._frames.extend(audio_segment.raw_data)
+
+    def append_file(self, path, format=None):
+        """
+        Decodes an audio file (e.g. an MP3) and appends its frames.
+        """
+        self.append(AudioSegment.from_file(path, format=format))
+
+    @property
+    def duration_seconds(self):
+        if not self._frames:
+            return 0.0
+        return len(self._frames) / (self.frame_rate * self.sample_width * self.channels)
+
+    def __len__(self):
+        return round(self.duration_seconds * 1000)
+
+    def to_segment(self):
+        """
+        Returns the assembled audio as one AudioSegment.
+        """
+        if not self._frames:
+            return AudioSegment.empty()
+        return AudioSegment(
+            bytes(self._frames),
+            frame_rate=self.frame_rate,
+            sample_width=self.sample_width,
+            channels=self.channels
+        )
+
+    def export(self, out_f, format="mp3", **kwargs):
+        """
+        Encodes the assembled audio once to out_f (a path or a file object), see AudioSegment.export.
+        """
+        return self.to_segment().export(out_f, format=format, **kwargs)
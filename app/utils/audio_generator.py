@@ -1,9 +1,19 @@
+import io
+import uuid
+import wave
 import tempfile
-import tts_wrapper
+import threading
 import streamlit as st
 from pydub import AudioSegment
 from itertools import product
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from utils.data_models import Gender
+from utils.config import get_setting
+from utils.audio_assembler import AudioAssembler
+from utils.tts_cache import cached_tts, lookup_tts
+from utils.rate_limiter import call_with_retries, get_rate_limiter
+from utils.conversation_generator import deduplicate_utterances
+from utils.length_controller import get_length_controller
 
 def generate_voice_combinations(available_voice_mappings):
     speakers, voices = zip(*available_voice_mappings.items())
@@ -11,8 +21,9 @@ def generate_voice_combinations(available_voice_mappings):
     return [dict(zip(speakers, combination)) for combination in voice_combinations]
 
 def list_voices(conversation):
-    speakers = [utterance.speaker for utterance in conversation.utterances[:2]]
+    return list_speaker_voices([utterance.speaker for utterance in conversation.utterances[:2]])
 
+def list_speaker_voices(speakers):
     if len(speakers) > 2:
         st.warning("More than 2 speakers in the conversation. This is not supported yet.")
 
@@ -35,21 +46,119 @@ def list_voices(conversation):
     return voice_options_1, voice_options_2
 
 
+# The model part of TTS cache keys: the pinned tts_wrapper picks the provider's model,
+# so change this when upgrading it to re-render cached clips
+TTS_WRAPPER_MODEL = "tts_wrapper"
+
+# Previews play as raw PCM in this format; the first utterance of an OpenAI voice is
+# streamed from the speech endpoint in it
+PREVIEW_STREAM_MODEL = "tts-1"
+PREVIEW_SAMPLE_RATE = 24000
+
+def _render_text_audio(voice, text):
+    # tts_wrapper pulls in every TTS provider SDK, so it is imported on first use
+    import tts_wrapper
+    # tts_wrapper does not expose typed errors, so every failure is retried a few times
+    return call_with_retries(
+        lambda: tts_wrapper.render(text, voice),
+        f"tts:{voice.split(':', 1)[0]}",
+        max_attempts=3,
+        retryable=lambda e: True
+    )
+
+def _to_wav(audio_segment):
+    if not audio_segment or len(audio_segment.raw_data) == 0:
+        return b""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(audio_segment.channels)
+        f.setsampwidth(audio_segment.sample_width)
+        f.setframerate(audio_segment.frame_rate)
+        f.writeframes(audio_segment.raw_data)
+    return buffer.getvalue()
+
+def _from_wav(data):
+    if not data:
+        return None
+    with wave.open(io.BytesIO(data), "rb") as f:
+        return AudioSegment(
+            f.readframes(f.getnframes()),
+            frame_rate=f.getframerate(),
+            sample_width=f.getsampwidth(),
+            channels=f.getnchannels()
+        )
+
+def generate_text_wav(voice, text):
+    """
+    Renders the text with the voice ("provider:voice") and returns the clip as WAV bytes
+    (empty if nothing was rendered), reusing the clip from the TTS cache (see
+    utils.tts_cache) when the same text was rendered with the voice before.
+    """
+    return cached_tts(voice, TTS_WRAPPER_MODEL, text, lambda: _to_wav(_render_text_audio(voice, text)))
+
 def generate_text_audio(voice, text):
-    return tts_wrapper.render(text, voice)
+    """
+    Like generate_text_wav, but returns an AudioSegment, or None if nothing was rendered.
+    """
+    return _from_wav(generate_text_wav(voice, text))
 
-import os
-import tempfile
-from pydub import AudioSegment
-import streamlit as st
-from utils.audio_generator import generate_text_audio
+def render_utterances(items, max_workers=None, on_utterance_done=None):
+    """
+    Renders utterances concurrently on a bounded thread pool and returns their audio in
+    the order of items.
 
-def generate_audio(conversation, voice1, voice2, output_file="conversation.mp3", preview=False):
-    final_audio = AudioSegment.empty()
-    utterances = conversation.utterances[:5] if preview else conversation.utterances
+    Every utterance is retried on its own (see generate_text_audio); utterances that still
+    fail or come back empty are rendered again in up to tts.retry_rounds further rounds.
+
+    Args:
+        items (list): (voice, text) per utterance.
+        max_workers (int): Utterances rendered at the same time (defaults to tts.max_concurrency).
+        on_utterance_done (callable): Called as on_utterance_done(done, total) after each
+            rendered utterance, on the calling thread.
 
-    # Create a mapping of speakers to selected voices
-    speakers = list(set([utterance.speaker.name for utterance in utterances]))
+    Raises:
+        RuntimeError: If an utterance could not be rendered, rather than leaving a gap.
+    """
+    if max_workers is None:
+        max_workers = get_setting("tts", "max_concurrency", 8)
+    retry_rounds = get_setting("tts", "retry_rounds", 1)
+
+    results = [None] * len(items)
+    errors = {}
+    pending = list(range(len(items)))
+    done = 0
+    with ThreadPoolExecutor(max_workers=max(1, int(max_workers))) as executor:
+        for _ in range(1 + retry_rounds):
+            futures = {executor.submit(generate_text_audio, *items[i]): i for i in pending}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    audio_segment = _to_audio_segment(future.result())
+                    if audio_segment is None:
+                        raise ValueError("empty audio")
+                except Exception as e:
+                    errors[i] = e
+                    continue
+                results[i] = audio_segment
+                errors.pop(i, None)
+                done += 1
+                if on_utterance_done:
+                    on_utterance_done(done, len(items))
+            pending = sorted(errors)
+            if not pending:
+                break
+
+    if errors:
+        failed = "; ".join(f"utterance {i + 1}: {errors[i]}" for i in sorted(errors))
+        raise RuntimeError(f"Failed to render {len(errors)} of {len(items)} utterances ({failed})")
+    return results
+
+def _voice_items(utterances, voice1, voice2):
+    """
+    Returns (voice, text) per utterance, with the first speaker on voice1 and the second on voice2.
+    """
+    # Create a mapping of speakers to selected voices, in order of appearance
+    speakers = list(dict.fromkeys(utterance.speaker.name for utterance in utterances))
     if len(speakers) < 2:
         st.warning("Conversation has less than two speakers. Assigning the same voice for all.")
     
@@ -57,32 +166,169 @@ def generate_audio(conversation, voice1, voice2, output_file="conversation.mp3",
     if len(speakers) > 1:
         voice_mapping[speakers[1]] = voice2
 
+    items = []
     for utterance in utterances:
         speaker = utterance.speaker.name
-        text = utterance.text
-
         if speaker not in voice_mapping:
             st.warning(f"⚠️ Voice not defined for speaker {speaker}, skipping.")
             continue
+        items.append((voice_mapping[speaker], utterance.text))
+    return items
+
+def generate_audio(conversation, voice1, voice2, output_file="conversation.mp3", preview=False, max_workers=None, on_utterance_done=None):
+    """
+    Voices the conversation (its first five utterances for previews) and exports it.
+
+    Utterances are rendered concurrently (see render_utterances) and assembled in
+    conversation order. on_utterance_done(done, total) reports progress.
+
+    Raises:
+        RuntimeError: If an utterance could not be rendered.
+    """
+    final_audio = AudioAssembler()
+    utterances = conversation.utterances[:5] if preview else conversation.utterances
+    items = _voice_items(utterances, voice1, voice2)
+
+    audio_segments = render_utterances(items, max_workers, on_utterance_done)
+    for (voice, text), audio_segment in zip(items, audio_segments):
+        get_length_controller().record_speech(voice, text, audio_segment.duration_seconds)
+        final_audio.append(audio_segment)
+
+    get_length_controller().save()
+    return export_audio(final_audio, output_file, preview)
+
+def stream_openai_speech(voice, text, api_key, model=PREVIEW_STREAM_MODEL, chunk_size=4096):
+    """
+    Yields the speech of an OpenAI voice (without the "openai:" prefix) as raw PCM chunks
+    (PREVIEW_SAMPLE_RATE, 16-bit, mono) while the rest is still being synthesized.
 
+    Pass the api_key resolved on the script thread (see utils.openai_utils.get_api_key):
+    the session is not visible from worker threads.
+    """
+    from utils.openai_utils import get_openai_client
+    get_rate_limiter(model).acquire()
+    with get_openai_client(api_key).audio.speech.with_streaming_response.create(
+        model=model, voice=voice, input=text, response_format="pcm"
+    ) as response:
+        yield from response.iter_bytes(chunk_size=chunk_size)
+
+def _to_preview_pcm(wav):
+    audio_segment = _from_wav(wav)
+    return audio_segment.set_frame_rate(PREVIEW_SAMPLE_RATE).set_channels(1).set_sample_width(2).raw_data
+
+class PreviewStream:
+    """
+    Renders the preview (the first `count` utterances) on a background thread into one
+    growing PCM buffer (PREVIEW_SAMPLE_RATE, 16-bit, mono) that the player reads while
+    it grows.
+
+    The first utterance of an OpenAI voice is streamed from the speech endpoint, so its
+    first chunks play while the rest is still being synthesized, unless the full render
+    has already cached it. The other utterances render at the same time through the
+    cached path of the full audio (see generate_text_wav) and are appended in order. The
+    streamed clip is not cached: the full render voices it through tts_wrapper.
+    """
+
+    def __init__(self, conversation, voice1, voice2, count=5, max_workers=None):
+        from utils.openai_utils import get_api_key
+        self.id = uuid.uuid4().hex
+        self.items = _voice_items(conversation.utterances[:count], voice1, voice2)
+        # Resolved here on the script thread, see stream_openai_speech
+        self._api_key = get_api_key() if self.items and self.items[0][0].startswith("openai:") else None
+        self._max_workers = max_workers or get_setting("tts", "max_concurrency", 8)
+        self._pcm = bytearray()
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self.finished = False
+        self.error = None
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def read(self, offset=0):
+        """
+        Returns (the PCM bytes from offset on, whether the preview is complete).
+        """
+        with self._lock:
+            return bytes(self._pcm[offset:]), self.finished
+
+    def cancel(self):
+        """
+        Stops rendering, e.g. when a new preview replaces this one.
+        """
+        self._cancelled.set()
+
+    def _append(self, data):
+        with self._lock:
+            self._pcm.extend(data)
+
+    def _stream_first(self, voice, text):
+        """
+        Streams the first utterance into the buffer. Returns False if it has to be
+        rendered like the others instead.
+        """
+        provider, _, name = voice.partition(":")
+        if provider != "openai" or lookup_tts(voice, TTS_WRAPPER_MODEL, text) is not None:
+            return False
+        streamed = False
         try:
-            # Generate audio for this utterance
-            audio_segment = generate_text_audio(voice_mapping[speaker], text)
-
-            # Ensure the audio is valid before adding
-            if audio_segment and len(audio_segment.raw_data) > 0:
-                final_audio += AudioSegment(
-                    audio_segment.raw_data,
-                    frame_rate=audio_segment.frame_rate,
-                    sample_width=audio_segment.sample_width,
-                    channels=audio_segment.channels
-                )
-            else:
-                st.error(f"❌ Failed to generate valid audio for {speaker}")
+            for chunk in stream_openai_speech(name, text, self._api_key):
+                if self._cancelled.is_set():
+                    return True
+                streamed = True
+                self._append(chunk)
+        except Exception as e:
+            # Audio that has already played cannot be taken back
+            if streamed:
+                raise RuntimeError(f"Streaming preview utterance 1 failed: {e}") from e
+            print(f"Streaming preview utterance 1 failed, rendering it instead: {e}")
+        return streamed
 
+    def _run(self):
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, int(self._max_workers))) as executor:
+                futures = [None] + [executor.submit(generate_text_wav, voice, text) for voice, text in self.items[1:]]
+                try:
+                    if self.items and not self._stream_first(*self.items[0]):
+                        futures[0] = executor.submit(generate_text_wav, *self.items[0])
+                    for i, future in enumerate(futures):
+                        if self._cancelled.is_set():
+                            return
+                        if future is None:
+                            continue
+                        try:
+                            clip = future.result()
+                        except Exception as e:
+                            raise RuntimeError(f"Failed to render preview utterance {i + 1}: {e}") from e
+                        if not clip:
+                            raise RuntimeError(f"Failed to render preview utterance {i + 1}: empty audio")
+                        self._append(_to_preview_pcm(clip))
+                finally:
+                    for future in futures:
+                        if future is not None:
+                            future.cancel()
         except Exception as e:
-            st.error(f"❌ Exception while generating audio for {speaker}: {e}")
+            self.error = e
+        finally:
+            with self._lock:
+                self.finished = True
+
+def _to_audio_segment(audio_segment):
+    """
+    Returns the rendered audio as a plain AudioSegment, or None if it is empty.
+    """
+    if not audio_segment or len(audio_segment.raw_data) == 0:
+        return None
+    return AudioSegment(
+        audio_segment.raw_data,
+        frame_rate=audio_segment.frame_rate,
+        sample_width=audio_segment.sample_width,
+        channels=audio_segment.channels
+    )
 
+def export_audio(final_audio, output_file="conversation.mp3", preview=False):
+    """
+    Encodes the assembled audio (an AudioAssembler) once to output_file (or a temporary
+    file for previews) and returns its path.
+    """
     # If no audio was generated, return an error
     if len(final_audio) == 0:
         st.error("🚨 Error: No valid audio was generated. Check voice mappings and text content.")
@@ -97,3 +343,92 @@ def generate_audio(conversation, voice1, voice2, output_file="conversation.mp3",
     else:
         final_audio.export(output_file, format="mp3")
         return output_file
+
+class VoicingPipeline:
+    """
+    Voices conversation segments in the background while later segments are still being
+    generated, so the audio is mostly done when the text is.
+
+    Segments may be added in any order; they are released to the TTS stage in conversation
+    order, after the same deduplication merge_conversation applies, so utterances the merge
+    drops are not voiced. finish() assembles the audio in the order of the merged conversation.
+    """
+
+    def __init__(self, voice_mapping, max_workers=None):
+        """
+        Args:
+            voice_mapping (dict): Speaker name -> voice ("provider:voice").
+            max_workers (int): Utterances voiced at the same time (defaults to tts.max_concurrency).
+        """
+        if max_workers is None:
+            max_workers = get_setting("tts", "max_concurrency", 8)
+        self.voice_mapping = voice_mapping
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(max_workers)))
+        self._lock = threading.Lock()
+        self._pending_segments = {}
+        self._next_segment = 0
+        self._released = []
+        self._jobs = {}
+
+    def _submit(self, utterance):
+        voice = self.voice_mapping.get(utterance.speaker.name)
+        if voice is None:
+            return None
+        return self._executor.submit(generate_text_audio, voice, utterance.text)
+
+    def add_segment(self, index, utterances):
+        """
+        Hands the final utterances of segment `index` to the TTS stage.
+        """
+        with self._lock:
+            self._pending_segments[index] = list(utterances)
+            while self._next_segment in self._pending_segments:
+                self._released.extend(self._pending_segments.pop(self._next_segment))
+                self._next_segment += 1
+            for utterance in deduplicate_utterances(self._released):
+                if id(utterance) not in self._jobs:
+                    self._jobs[id(utterance)] = self._submit(utterance)
+
+    def finish(self, utterances, output_file="conversation.mp3"):
+        """
+        Waits for the TTS stage and exports the audio of the merged conversation's utterances.
+        Utterances that were not handed over by add_segment, or whose background rendering
+        failed, are rendered with render_utterances. Returns the file path.
+
+        Raises:
+            RuntimeError: If an utterance could not be rendered, rather than leaving a gap.
+        """
+        items = []
+        audio_segments = []
+        retry = []
+        try:
+            for utterance in utterances:
+                speaker = utterance.speaker.name
+                if speaker not in self.voice_mapping:
+                    st.warning(f"⚠️ Voice not defined for speaker {speaker}, skipping.")
+                    continue
+                with self._lock:
+                    job = self._jobs.get(id(utterance))
+                audio_segment = None
+                if job is not None:
+                    try:
+                        audio_segment = _to_audio_segment(job.result())
+                    except Exception as e:
+                        print(f"Background voicing failed for {speaker}, retrying: {e}")
+                if audio_segment is None:
+                    retry.append(len(items))
+                items.append((self.voice_mapping[speaker], utterance.text))
+                audio_segments.append(audio_segment)
+        finally:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+        if retry:
+            for i, audio_segment in zip(retry, render_utterances([items[i] for i in retry])):
+                audio_segments[i] = audio_segment
+
+        final_audio = AudioAssembler()
+        for (voice, text), audio_segment in zip(items, audio_segments):
+            get_length_controller().record_speech(voice, text, audio_segment.duration_seconds)
+            final_audio.append(audio_segment)
+        get_length_controller().save()
+        return export_audio(final_audio, output_file)
@@ -0,0 +1,168 @@
+import json
+import time
+import uuid
+import atexit
+import posixpath
+import threading
+import fsspec
+
+# Pending index changes after which put() writes the index
+FLUSH_EVERY = 64
+
+class CacheStore:
+    """
+    Content-addressed blob store on any fsspec filesystem (local disk, az://, ...),
+    capped in size with least-recently-used eviction.
+
+    Entries are stored as <base>/<key[:2]>/<key>. Sizes and access times are kept in
+    <base>/index.json, which is written in batches by flush(): after FLUSH_EVERY changes,
+    when the size cap is exceeded and at interpreter exit. A flush merges the index on
+    disk first, so processes sharing the store keep each other's entries.
+
+    Blob reads and writes run outside the lock; it only guards the in-memory index. Blobs
+    and the index are written to a temporary sibling and moved into place, so readers in
+    this or another process (e.g. the agentwrite runner sharing the LLM cache) never see
+    a partial file.
+    """
+
+    def __init__(self, base: str, max_bytes: int):
+        self.base = base.rstrip("/")
+        self.fs, self.root = fsspec.core.url_to_fs(self.base)
+        self.max_bytes = max_bytes
+        self.index_path = posixpath.join(self.root, "index.json")
+        self._index = None
+        self._bytes = 0
+        self._pending = 0
+        self._removed = set()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def _entry_path(self, key):
+        return posixpath.join(self.root, key[:2], key)
+
+    def _write_atomic(self, path, data):
+        """
+        Writes data to a temporary sibling of path and moves it into place.
+        """
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with self.fs.open(temp_path, "wb") as f:
+                f.write(data)
+            self.fs.mv(temp_path, path)
+        except BaseException:
+            try:
+                self.fs.rm(temp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def _read_index(self):
+        try:
+            with self.fs.open(self.index_path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _load_index(self):
+        # Called with self._lock held
+        if self._index is None:
+            self._index = self._read_index()
+            self._bytes = sum(size for size, _ in self._index.values())
+        return self._index
+
+    def _set_entry(self, key, size):
+        # Called with self._lock held
+        index = self._load_index()
+        previous = index.get(key)
+        self._bytes += size - (previous[0] if previous else 0)
+        index[key] = [size, time.time()]
+        self._removed.discard(key)
+
+    def _drop_entry(self, key):
+        # Called with self._lock held
+        entry = self._load_index().pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[0]
+            self._removed.add(key)
+        return entry
+
+    def get(self, key: str):
+        """
+        Returns the cached bytes for key, or None on a miss.
+        """
+        try:
+            with self.fs.open(self._entry_path(key), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self._drop_entry(key)
+            return None
+        # Access times are only persisted on the next flush() to keep hits cheap
+        with self._lock:
+            self._set_entry(key, len(data))
+        return data
+
+    def put(self, key: str, data: bytes):
+        """
+        Stores data under key. The index is written and the least recently used entries
+        above the size cap are evicted in batches, see flush().
+        """
+        path = self._entry_path(key)
+        self.fs.makedirs(posixpath.dirname(path), exist_ok=True)
+        self._write_atomic(path, data)
+        with self._lock:
+            self._set_entry(key, len(data))
+            self._pending += 1
+            due = self._pending >= FLUSH_EVERY or self._bytes > self.max_bytes
+        if due:
+            self.flush()
+
+    def delete(self, key: str):
+        try:
+            self.fs.rm(self._entry_path(key))
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            if self._drop_entry(key) is not None:
+                self._pending += 1
+
+    def flush(self):
+        """
+        Merges the index on disk into the in-memory one, evicts the least recently used
+        entries above the size cap and writes the index.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if self._index is None or not self._pending and self._bytes <= self.max_bytes:
+                    return
+            on_disk = self._read_index()
+
+            with self._lock:
+                index = self._index
+                for key, (size, accessed) in on_disk.items():
+                    if key in self._removed:
+                        continue
+                    if key not in index:
+                        index[key] = [size, accessed]
+                        self._bytes += size
+                    elif accessed > index[key][1]:
+                        index[key][1] = accessed
+                evicted = []
+                for key, (size, _) in sorted(index.items(), key=lambda item: item[1][1]):
+                    if self._bytes <= self.max_bytes:
+                        break
+                    evicted.append(key)
+                    self._drop_entry(key)
+                snapshot = json.dumps(index)
+                self._pending = 0
+                self._removed.clear()
+
+            for key in evicted:
+                try:
+                    self.fs.rm(self._entry_path(key))
+                except FileNotFoundError:
+                    pass
+            self.fs.makedirs(self.root, exist_ok=True)
+            # Another process may be merging the index at the same time, see _read_index()
+            self._write_atomic(self.index_path, snapshot.encode("utf-8"))
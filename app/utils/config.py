@@ -0,0 +1,39 @@
+import os
+import functools
+import yaml
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "config.yaml")
+REPO_ROOT = os.path.dirname(os.path.abspath(CONFIG_PATH))
+
+@functools.lru_cache(maxsize=1)
+def load_config():
+    """
+    Loads config.yaml once per process. Returns an empty dict if the file is missing,
+    so scripts run outside the repository root fall back to the defaults.
+    """
+    try:
+        with open(CONFIG_PATH, "r", encoding="utf-8") as file:
+            return yaml.load(file, Loader=yaml.SafeLoader) or {}
+    except FileNotFoundError:
+        return {}
+
+def get_setting(section, key, default=None):
+    """
+    Returns config[section][key], or default if either level is missing.
+    """
+    return (load_config().get(section) or {}).get(key, default)
+
+def resolve_local_path(url):
+    """
+    Anchors a relative local path or file: URL (e.g. "file:.cache/llm") to the repository
+    root, so scripts started from another directory share the app's files. Absolute paths
+    and remote URLs (az://, ...) are returned unchanged.
+    """
+    prefix, path = "", url
+    if url.startswith("file:") and not url.startswith("file://"):
+        prefix, path = "file:", url[len("file:"):]
+    elif "://" in url:
+        return url
+    if os.path.isabs(path):
+        return url
+    return prefix + os.path.join(REPO_ROOT, path)
@@ -1,21 +1,27 @@
+def format_section_content(focus, discussion_points):
+    """
+    Formats a focus and its discussion points as a prompt for conversation generation.
+    """
+    point_texts = [dp.text for dp in discussion_points]
+    entity_list = [entity for dp in discussion_points for entity in dp.entities]
+
+    return (
+        f"FOCUS: {focus}\n"
+        f"DISCUSSION POINTS:\n- " + "\n- ".join(point_texts) + "\n"
+        f"MENTIONED ENTITIES: {', '.join(set(entity_list)) if entity_list else 'None'}"
+    )
+
 def get_section_contents(outline):
     """
     Extracts structured section contents for use in conversation generation.
     """
-    section_contents = []
-    for section in outline.sections:
-        discussion_points = [dp.text for dp in section.discussion_points]
-        entity_list = [entity for dp in section.discussion_points for entity in dp.entities]
-
-        # Format the section content
-        section_content = (
-            f"FOCUS: {section.focus}\n"
-            f"DISCUSSION POINTS:\n- " + "\n- ".join(discussion_points) + "\n"
-            f"MENTIONED ENTITIES: {', '.join(set(entity_list)) if entity_list else 'None'}"
-        )
-        section_contents.append(section_content)
+    return [format_section_content(section.focus, section.discussion_points) for section in outline.sections]
 
-    return section_contents
+def get_segment_contents(segments):
+    """
+    Extracts structured contents for each planned segment (see utils.segment_planner).
+    """
+    return [format_section_content(segment.focus, segment.discussion_points) for segment in segments]
 
 
 def create_context_and_prompts(outline):
@@ -32,6 +38,13 @@ def create_context_and_prompts(outline):
 
     return context, prompts
 
+def create_context_and_segment_prompts(outline, segments):
+    """
+    Like create_context_and_prompts, but with one prompt per planned segment.
+    """
+    context, _ = create_context_and_prompts(outline)
+    return context, get_segment_contents(segments)
+
 def get_section_contents_old(outline):
     section_contents = []
     for section in outline.sections:
@@ -1,5 +1,7 @@
-from utils.data_models import Conversation, Monologue, TopicOutline
-from utils.llm_calls import get_openai_client
+from utils.data_models import Conversation, Monologue, TopicOutline, ConversationResponse, MonologueResponse, ConversationHandoffResponse, MonologueHandoffResponse
+from utils.openai_utils import get_openai_client
+from utils.llm_cache import create_chat_completion
+from utils.model_routing import get_route
 import streamlit as st
 
 
@@ -69,18 +71,48 @@ def merge_conversation_old(conversation_pieces: list, outline: TopicOutline) ->
             full_conversation.utterances.extend(piece.utterances)
         return full_conversation
 
-def create_segment_prompt(context, prompt, segment_info, previous_summary=None):
+def get_response_format(num_speakers, with_handoff=False):
+    """
+    Returns the structured output format for a segment, optionally with the hand-off
+    summary and introduced entities (see segment_handoff).
+    """
+    if num_speakers == 1:
+        return MonologueHandoffResponse if with_handoff else MonologueResponse
+    return ConversationHandoffResponse if with_handoff else ConversationResponse
+
+def create_segment_prompt(context, prompt, segment_info, previous_summary=None, with_handoff=False):
     """
     Generate a prompt for a specific segment of the conversation.
+
+    With with_handoff, the model is also asked for the hand-off summary and introduced
+    entities of a *HandoffResponse format.
+
+    The prompt only says whether the segment opens or closes the conversation, not its
+    number, so the segments of an unchanged section keep their prompt (and can be reused,
+    see utils.section_fingerprints) when other sections gain or lose segments.
     """
-    segment_num = segment_info["current_split"] + 1
-    total_segments = segment_info["total_splits"]
+    first = segment_info["current_split"] == 0
+    last = segment_info["current_split"] == segment_info["total_splits"] - 1
+    if first and last:
+        position = "the only segment, which opens and closes the conversation"
+    elif first:
+        position = "the opening segment of the conversation"
+    elif last:
+        position = "the closing segment of the conversation"
+    else:
+        position = "a middle segment of the conversation"
     num_speakers = segment_info.get("num_speakers", 2)
+    tokens_per_split = segment_info.get("tokens_per_split")
     previous_entities = segment_info.get("previous_entities", [])
     document_context = st.session_state.get("document_context", None)
 
+    length_instruction = ""
+    if tokens_per_split:
+        words_per_split = segment_info.get("target_words") or int(tokens_per_split / segment_info.get("tokens_per_word", 1.3))
+        length_instruction = f"\n    - 📏 Aim for roughly {words_per_split} words of spoken text in this segment"
+
     base_prompt = f"""
-    🔹 SEGMENT {segment_num} OF {total_segments}
+    🔹 SEGMENT: {position}
 
     📌 CONTEXT:
     {context}
@@ -97,9 +129,9 @@ def create_segment_prompt(context, prompt, segment_info, previous_summary=None):
     {', '.join(previous_entities) if previous_entities else 'None'}
 
     ✅ INSTRUCTIONS:
-    - 🔢 This is segment {segment_num} of {total_segments}
+    - 🔢 This is {position}{length_instruction}
     - 🗣️ This is a {'monologue' if num_speakers == 1 else 'conversation'}
-    - 👋 Only include greetings and introductions if this is segment 1
+    - 👋 Only include greetings and introductions if this is the opening segment
     - 📜 Base responses strictly on the document context if available
     - 🔗 Use specific quotes and references from the document where relevant
     - 🔄 For previously mentioned entities:
@@ -116,7 +148,7 @@ def create_segment_prompt(context, prompt, segment_info, previous_summary=None):
     - 🎨 If discussing abstract ideas, provide vivid examples, analogies, or stories.
     """
 
-    if previous_summary and segment_num > 1:
+    if previous_summary and not first:
         base_prompt += f"""
         
         🔄 PREVIOUS SEGMENT SUMMARY:
@@ -125,9 +157,16 @@ def create_segment_prompt(context, prompt, segment_info, previous_summary=None):
         ➡️ Continue naturally from this point. Focus on advancing the discussion **rather than repeating past ideas**.
         """
 
+    if with_handoff:
+        base_prompt += """
+    📝 HAND-OFF:
+    - After the utterances, fill in handoff_summary with a short summary (at most ~120 words) of this segment: main topics, key conclusions or insights, the emotional/conversational state of the speakers and the point where it ended
+    - List in introduced_entities the entities introduced for the first time in this segment
+    """
+
     return base_prompt
 
-def generate_segment_summary(conversation_piece):
+def generate_segment_summary(conversation_piece, use_cache=True):
     """
     Genererer et kort sammendrag av et samtalesegment.
     """
@@ -145,10 +184,62 @@ def generate_segment_summary(conversation_piece):
     {conversation_text}
     """
     
-    completion = client.chat.completions.create(
-        model="gpt-4o",
+    route = get_route("segment_summary")
+    return create_chat_completion(
+        client,
+        model=route["model"],
         messages=[{"role": "user", "content": summary_prompt}],
-        max_tokens=200
+        max_tokens=route["max_tokens"] or 200,
+        use_cache=use_cache,
+        route=route
     )
-    
-    return completion.choices[0].message.content
+
+def segment_handoff(response, piece, previous_entities, use_cache=True):
+    """
+    Returns (summary, entities introduced) of a generated segment for the next one.
+
+    Uses the hand-off fields of a *HandoffResponse when the model filled them in, and
+    falls back to a separate generate_segment_summary call and the utterance entities
+    otherwise.
+    """
+    summary = (getattr(response, "handoff_summary", None) or "").strip()
+    entities = getattr(response, "introduced_entities", None)
+    if not entities:
+        entities = [entity for utterance in piece.utterances for entity in utterance.entities]
+    if not summary:
+        summary = generate_segment_summary(piece, use_cache=use_cache)
+    return summary, [entity for entity in dict.fromkeys(entities) if entity not in previous_entities]
+
+def create_handoff_context(outline: TopicOutline, segment_index: int, segments=None):
+    """
+    Builds the hand-off context for a segment from the outline alone, so segments can be
+    drafted without waiting for the previous segment's generated summary.
+
+    Args:
+        outline (TopicOutline): The outline of the conversation.
+        segment_index (int): Index of the segment to build the hand-off for.
+        segments (list): Planned segments (see utils.segment_planner); defaults to one
+            segment per outline section.
+
+    Returns:
+        tuple: (summary of the previous segment or None for the first one,
+                entities introduced before this segment)
+    """
+    parts = segments if segments is not None else outline.sections
+    previous_entities = list(outline.previous_entities)
+    for part in parts[:segment_index]:
+        previous_entities.extend(getattr(part, "entities", []))
+        previous_entities.extend(entity for dp in part.discussion_points for entity in dp.entities)
+    previous_entities = list(dict.fromkeys(previous_entities))
+
+    if segment_index == 0 or segment_index > len(parts):
+        return None, previous_entities
+
+    previous_part = parts[segment_index - 1]
+    discussion_points = "\n- ".join(dp.text for dp in previous_part.discussion_points)
+    handoff = (
+        f"The previous segment focused on: {previous_part.focus}\n"
+        f"It covered these discussion points:\n- {discussion_points}\n"
+        f"The speakers have just finished discussing the last of these points."
+    )
+    return handoff, previous_entities
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Optional, Literal
 from enum import Enum
 
 
@@ -24,6 +24,12 @@ class Section(BaseModel):
     discussion_points: list[DiscussionPoint] = Field(..., description="List of discussion points for this section")
     entities: list[str] = Field(..., description="List of all entities mentioned in this section")
 
+class PlannedSegment(BaseModel):
+    section_index: int = Field(..., description="Index of the outline section this segment belongs to")
+    focus: str = Field(..., description="The focus of the section this segment belongs to")
+    discussion_points: list[DiscussionPoint] = Field(..., description="Discussion points covered by this segment")
+    tokens: int = Field(..., description="Output token budget for this segment")
+
 class TopicOutline(BaseModel):
     context: str = Field(..., description="The context for the conversation")
     sections: list[Section] = Field(..., description="List of sections in the outline")
@@ -32,6 +38,42 @@ class TopicOutline(BaseModel):
     num_speakers: int = Field(description="Number of speakers in the conversation")
     previous_entities: list[str] = Field(description="List of entities mentioned in previous sections")
 
+# For two-phase outline generation: the skeleton is generated first, then every
+# section is expanded into a full Section in parallel
+class SectionPlan(BaseModel):
+    focus: str = Field(..., description="The main focus of this section")
+    brief: str = Field(..., description="One or two sentences on what this section covers and how it connects to the sections around it")
+
+class OutlineSkeleton(BaseModel):
+    context: str = Field(..., description="The context for the conversation")
+    speakers: list[Speaker] = Field(..., description="List of speakers in the conversation")
+    sections: list[SectionPlan] = Field(..., description="The sections of the outline, in order")
+
+# For patch-based outline updates: the LLM returns operations that are applied to the
+# existing outline instead of a whole new outline
+class OutlineOperation(BaseModel):
+    op: Literal[
+        "set_context",
+        "replace_text",
+        "update_section",
+        "insert_section",
+        "remove_section",
+        "move_section",
+        "update_speaker",
+        "add_speaker",
+        "remove_speaker",
+    ] = Field(..., description="The operation to apply")
+    index: Optional[int] = Field(..., description="0-based index of the section or speaker the operation applies to (insert_section: the index the new section gets)")
+    to_index: Optional[int] = Field(..., description="move_section only: the new 0-based index of the section")
+    context: Optional[str] = Field(..., description="set_context only: the new context")
+    old_text: Optional[str] = Field(..., description="replace_text only: the exact text to replace everywhere in the outline")
+    new_text: Optional[str] = Field(..., description="replace_text only: the replacement text")
+    section: Optional[Section] = Field(..., description="update_section and insert_section only: the complete new section")
+    speaker: Optional[Speaker] = Field(..., description="update_speaker and add_speaker only: the complete new speaker")
+
+class OutlinePatch(BaseModel):
+    operations: list[OutlineOperation] = Field(..., description="The operations to apply, in order")
+
 class MonologueUtterance(BaseModel):
     speaker: Speaker
     text: str = Field(..., description="The text content of the utterance")
@@ -61,6 +103,17 @@ class MonologueResponse(BaseModel):
 class ConversationResponse(BaseModel):
     utterances: list[ConversationUtterance]
 
+# Response formats that also carry the hand-off to the next segment, so the segment and its
+# summary come from one call. The hand-off fields come after the utterances, so streamed
+# utterances still arrive first.
+class MonologueHandoffResponse(MonologueResponse):
+    handoff_summary: str = Field(..., description="Short summary of this segment for the next one: main topics, key insights, the speakers' mood and the point where it ended")
+    introduced_entities: list[str] = Field(..., description="Entities (concepts, characters, etc.) introduced for the first time in this segment")
+
+class ConversationHandoffResponse(ConversationResponse):
+    handoff_summary: str = Field(..., description="Short summary of this segment for the next one: main topics, key insights, the speakers' mood and the point where it ended")
+    introduced_entities: list[str] = Field(..., description="Entities (concepts, characters, etc.) introduced for the first time in this segment")
+
 class DocumentChunk(BaseModel):
     """
     Represents a single chunk of a document.
@@ -1,6 +1,4 @@
 import streamlit as st
-from PyPDF2 import PdfReader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 
 def upload_and_process_document():
     """
@@ -8,7 +6,10 @@ def upload_and_process_document():
     """
     uploaded_file = st.file_uploader("Upload a Document (PDF or Text)", type=["pdf", "txt"])
     if uploaded_file:
+        # PyPDF2 and langchain are slow to import, so they are only loaded for an upload
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
         if uploaded_file.name.endswith('.pdf'):
+            from PyPDF2 import PdfReader
             reader = PdfReader(uploaded_file)
             text = "\n".join([page.extract_text() for page in reader.pages])
         elif uploaded_file.name.endswith('.txt'):
@@ -1,31 +1,32 @@
-import os
-from openai import OpenAI
 from typing import List
 from PIL import Image
 from io import BytesIO
 import base64
 import io
 from . import persistence
-
-# Create OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from .openai_utils import get_openai_client
+from .rate_limiter import call_with_retries
 
 def generate_images_from_plan(image_prompts: List[str]) -> List[str]:
     """
     Generate one image per prompt using DALL·E and save them as JPGs.
     Returns a list of saved image file paths.
     """
+    client = get_openai_client()
     image_paths = []
 
     for idx, prompt in enumerate(image_prompts, 1):
         print(f"🎨 Generating image for: {prompt}")
 
         try:
-            response = client.images.generate(
-                prompt=prompt,
-                n=1,
-                size="1024x1024",  # DALL·E high-res
-                response_format="b64_json"
+            response = call_with_retries(
+                lambda: client.images.generate(
+                    prompt=prompt,
+                    n=1,
+                    size="1024x1024",  # DALL·E high-res
+                    response_format="b64_json"
+                ),
+                "dall-e-2"
             )
 
             image_data = response.data[0].b64_json  # <-- NEW object access
@@ -1,11 +1,9 @@
-import os
-from openai import OpenAI
 from typing import List
+from utils.llm_cache import create_chat_completion
+from utils.openai_utils import get_openai_client
+from utils.model_routing import get_route
 
-# Create a client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-def generate_image_prompts_from_steps(theme: str, plan_steps: List[str]) -> List[str]:
+def generate_image_prompts_from_steps(theme: str, plan_steps: List[str], use_cache: bool = True) -> List[str]:
     """
     Use GPT to transform plan steps + theme into image prompts suitable for DALL·E.
     """
@@ -23,14 +21,16 @@ Style and atmosphere should match the theme "{theme}".
 Return the prompts as a numbered list.
 """
 
-    response = client.chat.completions.create(
-        model="gpt-4o",
+    route = get_route("image_prompts")
+    raw_text = create_chat_completion(
+        get_openai_client(),
+        model=route["model"],
         messages=[{"role": "user", "content": prompt}],
         temperature=0.9,
-        max_tokens=1000
+        max_tokens=route["max_tokens"] or 1000,
+        use_cache=use_cache,
+        route=route
     )
-
-    raw_text = response.choices[0].message.content
     
     # Extract just the lines starting with numbers (e.g. 1. ...)
     image_prompts = [line.partition(".")[2].strip() for line in raw_text.splitlines() if line.strip().startswith(tuple("123456789"))]
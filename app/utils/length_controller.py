@@ -0,0 +1,127 @@
+import os
+import json
+import math
+import threading
+import functools
+from utils.config import get_setting, resolve_local_path
+from utils.token_estimator import TokenEstimator
+
+# Targets are rounded to these steps, so the small drift of the averages between runs
+# does not change the request (and miss the LLM cache) for the same inputs
+WORDS_STEP = 50
+MAX_TOKENS_STEP = 512
+
+class LengthController:
+    """
+    Learns how long generated segments and their audio actually turn out, so the requested
+    length is hit on the first pass.
+
+    Per model it tracks tokens per spoken word, completion tokens (the whole structured
+    response) per spoken word and the fill ratio (words written / words asked for); per
+    voice it tracks spoken words per minute. Rates are exponential moving averages, kept
+    in a local JSON file between runs.
+    """
+
+    def __init__(self, path=None, smoothing=None):
+        # A relative path is taken from the repository root, not the working directory
+        self.path = resolve_local_path(path or get_setting("length_control", "path", ".cache/length_rates.json"))
+        self.smoothing = smoothing or get_setting("length_control", "smoothing", 0.3)
+        self._lock = threading.Lock()
+        self.rates = {"models": {}, "voices": {}}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self.rates.update(json.load(f))
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Ignoring unreadable length rates {self.path}: {e}")
+
+    def _update(self, group, name, key, value):
+        with self._lock:
+            rates = self.rates[group].setdefault(name, {})
+            if key in rates:
+                value = rates[key] * (1 - self.smoothing) + value * self.smoothing
+            rates[key] = value
+
+    def _count_sample(self, group, name):
+        with self._lock:
+            rates = self.rates[group].setdefault(name, {})
+            rates["samples"] = rates.get("samples", 0) + 1
+
+    def model_rate(self, model, key, default):
+        return self.rates["models"].get(model, {}).get(key, default)
+
+    def words_per_minute(self, voices=None):
+        """
+        Measured speaking rate of the voices (all measured voices if none are given), or None.
+        """
+        known = self.rates["voices"]
+        rates = [known[voice]["words_per_minute"] for voice in (voices or known) if voice in known]
+        return sum(rates) / len(rates) if rates else None
+
+    def calibrate(self, estimator: TokenEstimator, model, voices=None) -> TokenEstimator:
+        """
+        Replaces the estimator's assumed rates with the measured ones, where known.
+        """
+        estimator.tokens_per_word = self.model_rate(model, "tokens_per_word", estimator.tokens_per_word)
+        estimator.words_per_minute = self.words_per_minute(voices) or estimator.words_per_minute
+        return estimator
+
+    def target_words(self, model, tokens):
+        """
+        Words to ask for so that the model writes about `tokens` tokens of spoken text,
+        rounded to WORDS_STEP.
+        """
+        words = tokens / self.model_rate(model, "tokens_per_word", 1.3)
+        words /= self.model_rate(model, "fill_ratio", 1.0)
+        return max(WORDS_STEP, round(words / WORDS_STEP) * WORDS_STEP)
+
+    def max_tokens(self, model, tokens, limit=4096):
+        """
+        Completion budget for a segment of `tokens` spoken tokens: the expected size of the
+        structured response with headroom, rounded up to MAX_TOKENS_STEP and capped at limit.
+        """
+        words = tokens / self.model_rate(model, "tokens_per_word", 1.3)
+        expected = words * self.model_rate(model, "completion_tokens_per_word", 2.5)
+        budget = math.ceil((expected * 1.5 + 512) / MAX_TOKENS_STEP) * MAX_TOKENS_STEP
+        return max(1024, min(limit, budget))
+
+    def record_segment(self, model, requested_words, response, estimator=None):
+        """
+        Records a generated segment: the words asked for and the parsed response.
+        """
+        texts = [utterance.text for utterance in response.utterances]
+        words = sum(len(text.split()) for text in texts)
+        if not words:
+            return
+        estimator = estimator or TokenEstimator()
+        text_tokens = sum(len(estimator.encoder.encode(text)) for text in texts)
+        completion_tokens = len(estimator.encoder.encode(response.model_dump_json()))
+        self._update("models", model, "tokens_per_word", text_tokens / words)
+        self._update("models", model, "completion_tokens_per_word", completion_tokens / words)
+        if requested_words:
+            self._update("models", model, "fill_ratio", words / requested_words)
+        self._count_sample("models", model)
+
+    def record_speech(self, voice, text, seconds):
+        """
+        Records the duration of the audio rendered for a text.
+        """
+        words = len(text.split())
+        if words and seconds > 0:
+            self._update("voices", voice, "words_per_minute", words / seconds * 60)
+            self._count_sample("voices", voice)
+
+    def save(self):
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(self.rates, f, indent=2)
+            os.replace(temp_path, self.path)
+
+@functools.lru_cache(maxsize=1)
+def get_length_controller() -> LengthController:
+    """
+    Returns the process-wide LengthController.
+    """
+    return LengthController()
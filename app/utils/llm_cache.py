@@ -0,0 +1,175 @@
+import json
+import asyncio
+import hashlib
+import functools
+from pydantic import BaseModel
+from utils.cache_store import CacheStore
+from utils.config import get_setting, resolve_local_path
+from utils.model_routing import timed_call, with_route_timeout
+from utils.rate_limiter import call_with_retries, acall_with_retries, estimate_request_tokens, get_rate_limiter
+
+@functools.lru_cache(maxsize=1)
+def get_llm_cache():
+    """
+    Returns the process-wide LLM response cache, or None if it is disabled in config.yaml.
+    A relative local base is taken from the repository root, not the working directory.
+    """
+    if not get_setting("llm_cache", "enabled", True):
+        return None
+    base = resolve_local_path(get_setting("llm_cache", "base", "file:.cache/llm"))
+    max_mb = get_setting("llm_cache", "max_mb", 512)
+    return CacheStore(base, int(max_mb * 1024 * 1024))
+
+def _schema_hash(response_format):
+    if response_format is None:
+        return None
+    if isinstance(response_format, type) and issubclass(response_format, BaseModel):
+        schema = response_format.model_json_schema()
+    else:
+        schema = response_format
+    return hashlib.sha256(json.dumps(schema, sort_keys=True).encode("utf-8")).hexdigest()
+
+def make_cache_key(model, messages, response_format=None, **params):
+    """
+    Content address of a chat completion request: model, messages, sampling parameters
+    and the hash of the response_format schema.
+    """
+    payload = {
+        "model": model,
+        "messages": messages,
+        "params": params,
+        "response_format": _schema_hash(response_format),
+    }
+    payload_json = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload_json.encode("utf-8")).hexdigest()
+
+def lookup_completion(key, response_format=None):
+    """
+    Returns the cached message content (str), parsed into response_format if given,
+    or None on a miss.
+    """
+    cache = get_llm_cache()
+    if cache is None:
+        return None
+    data = cache.get(key)
+    if data is None:
+        return None
+    try:
+        content = json.loads(data)["content"]
+        if isinstance(response_format, type) and issubclass(response_format, BaseModel):
+            return response_format.model_validate_json(content)
+        return content
+    except Exception as e:
+        print(f"Discarding unreadable LLM cache entry {key}: {e}")
+        cache.delete(key)
+        return None
+
+def store_completion(key, value):
+    """
+    Stores a message content (str) or parsed pydantic response under key.
+    """
+    cache = get_llm_cache()
+    if cache is None or value is None:
+        return
+    content = value.model_dump_json() if isinstance(value, BaseModel) else value
+    cache.put(key, json.dumps({"content": content}, ensure_ascii=False).encode("utf-8"))
+
+def cached_completion(fetch, model, messages, response_format=None, use_cache=True, on_fresh=None, **params):
+    """
+    Returns the cached result for the request, or calls fetch() and caches its result.
+
+    Args:
+        fetch (callable): Performs the request and returns the message content (str)
+            or the parsed response_format instance.
+        model (str): The model of the request.
+        messages (list): The messages of the request.
+        response_format: The pydantic model or JSON schema of the request, if any.
+        use_cache (bool): Set to False to bypass the cache for this call.
+        on_fresh (callable): Called with the result when it comes from fetch() rather
+            than from the cache, e.g. to measure only real responses.
+        **params: The remaining request parameters (temperature, max_tokens, ...).
+    """
+    if use_cache:
+        key = make_cache_key(model, messages, response_format, **params)
+        cached = lookup_completion(key, response_format)
+        if cached is not None:
+            return cached
+    value = fetch()
+    if on_fresh:
+        on_fresh(value)
+    if use_cache:
+        store_completion(key, value)
+    return value
+
+def _scheduled(model, messages, params, create, route=None):
+    """
+    Runs a chat completion call within the model's rate limits (see utils.rate_limiter),
+    then hands the unused part of the token reservation back to the limiter. The latency
+    of the successful attempt is recorded against the route, if one is given.
+    """
+    def attempt():
+        with timed_call(route):
+            return create()
+
+    tokens = estimate_request_tokens(model, messages, params.get("max_tokens"))
+    completion = call_with_retries(attempt, model, tokens)
+    if completion.usage:
+        get_rate_limiter(model).release(tokens, completion.usage.total_tokens)
+    return completion
+
+def parse_chat_completion(client, model, messages, response_format, use_cache=True, route=None, on_fresh=None, **params):
+    """
+    Cached, rate-scheduled client.beta.chat.completions.parse(). Returns the parsed message.
+    route (see utils.model_routing.get_route) sets the timeout and records the latency;
+    on_fresh is called with the parsed message unless it came from the cache.
+    """
+    client = with_route_timeout(client, route)
+    return cached_completion(
+        lambda: _scheduled(model, messages, params, lambda: client.beta.chat.completions.parse(
+            model=model, messages=messages, response_format=response_format, **params
+        ), route).choices[0].message.parsed,
+        model, messages, response_format, use_cache, on_fresh, **params
+    )
+
+def create_chat_completion(client, model, messages, use_cache=True, route=None, **params):
+    """
+    Cached, rate-scheduled client.chat.completions.create(). Returns the message content.
+    route (see utils.model_routing.get_route) sets the timeout and records the latency.
+    """
+    client = with_route_timeout(client, route)
+    return cached_completion(
+        lambda: _scheduled(model, messages, params, lambda: client.chat.completions.create(
+            model=model, messages=messages, **params
+        ), route).choices[0].message.content,
+        model, messages, None, use_cache, None, **params
+    )
+
+async def aparse_chat_completion(client, model, messages, response_format, use_cache=True, route=None, on_fresh=None, **params):
+    """
+    Cached, rate-scheduled AsyncOpenAI.beta.chat.completions.parse(). Returns the parsed message.
+    route (see utils.model_routing.get_route) sets the timeout and records the latency;
+    on_fresh is called with the parsed message unless it came from the cache.
+    """
+    key = make_cache_key(model, messages, response_format, **params)
+    if use_cache:
+        # The cache does blocking (possibly remote) I/O, keep it off the event loop
+        cached = await asyncio.to_thread(lookup_completion, key, response_format)
+        if cached is not None:
+            return cached
+    client = with_route_timeout(client, route)
+    async def attempt():
+        with timed_call(route):
+            return await client.beta.chat.completions.parse(
+                model=model, messages=messages, response_format=response_format, **params
+            )
+
+    tokens = estimate_request_tokens(model, messages, params.get("max_tokens"))
+    completion = await acall_with_retries(attempt, model, tokens)
+    if completion.usage:
+        get_rate_limiter(model).release(tokens, completion.usage.total_tokens)
+    parsed = completion.choices[0].message.parsed
+    if on_fresh:
+        on_fresh(parsed)
+    if use_cache:
+        await asyncio.to_thread(store_completion, key, parsed)
+    return parsed
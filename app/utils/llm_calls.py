@@ -1,24 +1,72 @@
-import openai
-import requests
-from utils.openai_utils import get_openai_client
-from utils.data_models import Speaker, Gender, Conversation, ConversationUtterance, MonologueUtterance, Monologue, TopicOutline, ConversationResponse, MonologueResponse
-from utils.conversation_generator import create_segment_prompt, generate_segment_summary
+import time
+import asyncio
+from typing import get_args
+from utils.openai_utils import get_openai_client, get_async_openai_client, run_async, get_http_session
+from utils.data_models import Speaker, Gender, Conversation, ConversationUtterance, MonologueUtterance, Monologue, TopicOutline
+from utils.conversation_generator import create_segment_prompt, create_handoff_context, get_response_format, segment_handoff
+from utils.config import get_setting
+from utils.rate_limiter import call_with_retries, get_rate_limiter, estimate_request_tokens, is_retryable, retry_delay
+from utils.llm_cache import parse_chat_completion, aparse_chat_completion, make_cache_key, lookup_completion, store_completion
+from utils.length_controller import get_length_controller
+from utils.model_routing import get_route, record_latency, with_route_timeout
 import streamlit as st
 
-def fetch_conversation_responses(context, prompts, outline: TopicOutline, model="gpt-4o") -> list[Conversation | Monologue]:
+def apply_length_plan(segment_info, segment, model, limit=4096):
+    """
+    Sets the length target of a planned segment in segment_info from the measured rates
+    (see utils.length_controller) and returns the max_tokens to request for it, at most limit.
+    """
+    if segment is None:
+        return limit
+    controller = get_length_controller()
+    segment_info["tokens_per_split"] = segment.tokens
+    segment_info["target_words"] = controller.target_words(model, segment.tokens)
+    return controller.max_tokens(model, segment.tokens, limit)
+
+def segment_recorder(model, target_words):
+    """
+    on_fresh callback that feeds a generated segment to the length controller. Cached
+    responses are not passed to it, so replays do not count as new measurements.
+    """
+    return lambda response: get_length_controller().record_segment(model, target_words, response)
+
+def reused_segment_handoff(outline, segment_index, segments, utterances, previous_entities):
+    """
+    Hand-off after a reused segment (see utils.section_fingerprints): stored segments have
+    no live summary, so the summary comes from the outline. Returns (summary, new entities).
+    """
+    summary, _ = create_handoff_context(outline, segment_index + 1, segments)
+    entities = [entity for utterance in utterances for entity in utterance.entities]
+    return summary, [entity for entity in dict.fromkeys(entities) if entity not in previous_entities]
+
+def fetch_conversation_responses(context, prompts, outline: TopicOutline, model=None, segments=None, on_segment_done=None, use_cache=True, on_segment_ready=None, reused_segments=None) -> list[Conversation | Monologue]:
     """
     Fetch conversation responses from the OpenAI client.
 
     Args:
         context (str): The context for the conversation.
-        prompts (list): List of user prompts.
+        prompts (list): List of user prompts, one per segment.
         outline (TopicOutline): The outline of the conversation.
-        model (str): The OpenAI model to use for generating responses.
+        model (str): The OpenAI model to use for generating responses (defaults to the
+            conversation_segment route of the active profile, see utils.model_routing).
+        segments (list): Planned segments matching the prompts (see utils.segment_planner).
+        on_segment_done (callable): Called as on_segment_done(done, total) after each segment.
+        use_cache (bool): Reuse cached responses for unchanged requests (see utils.llm_cache).
+        on_segment_ready (callable): Called as on_segment_ready(index, utterances) as soon as
+            a segment has been generated (see utils.audio_generator.VoicingPipeline).
+        reused_segments (dict): {segment index: utterances} of segments to reuse instead of
+            generating them (see utils.section_fingerprints).
+
+    Each segment also returns its hand-off summary for the next one (generation.self_summarize
+    in config.yaml); a separate summary call is only made if the model leaves it out.
 
     Returns:
         list: A list of conversation pieces (responses from the LLM).
     """
     client = get_openai_client()
+    route = get_route("conversation_segment", model=model)
+    model = route["model"]
+    self_summarize = get_setting("generation", "self_summarize", True)
     conversation_pieces = []
     previous_summary = None
     previous_entities = []
@@ -31,45 +79,377 @@ def fetch_conversation_responses(context, prompts, outline: TopicOutline, model=
     })
 
     outline_dict = outline.model_dump()
-    is_monologue = outline.num_speakers == 1
-    response_format = MonologueResponse if is_monologue else ConversationResponse
-    final_format = Monologue if is_monologue else Conversation
+    response_format = get_response_format(outline.num_speakers, self_summarize)
+    final_format = Monologue if outline.num_speakers == 1 else Conversation
+
+    reused_segments = reused_segments or {}
 
     for i, prompt in enumerate(prompts):
+        segment_info["current_split"] = i
+        segment_info["total_splits"] = len(prompts)
+
+        if i in reused_segments:
+            full_response = final_format(outline=outline_dict, utterances=reused_segments[i])
+            conversation_pieces.append(full_response)
+            if on_segment_ready:
+                on_segment_ready(i, full_response.utterances)
+            previous_summary, new_entities = reused_segment_handoff(outline, i, segments, full_response.utterances, previous_entities)
+            previous_entities.extend(new_entities)
+            segment_info["previous_entities"] = previous_entities
+            if on_segment_done:
+                on_segment_done(i + 1, len(prompts))
+            continue
+
+        # Rates measured on earlier segments already apply to this one
+        max_tokens = apply_length_plan(segment_info, segments[i] if segments else None, model, route["max_tokens"] or 4096)
+
         segment_prompt = create_segment_prompt(
             context, 
             prompt, 
             segment_info,
-            previous_summary
+            previous_summary,
+            with_handoff=self_summarize
         )
         
         try:
-            completion = client.beta.chat.completions.parse(
+            response = parse_chat_completion(
+                client,
                 model=model,
                 messages=[
                     {"role": "system", "content": segment_prompt}
                 ],
                 temperature=0.7,
                 top_p=0.7,
-                max_tokens=4096,
-                response_format=response_format
+                max_tokens=max_tokens,
+                response_format=response_format,
+                use_cache=use_cache,
+                route=route,
+                on_fresh=segment_recorder(model, segment_info.get("target_words"))
             )
-            response = completion.choices[0].message.parsed
             full_response = final_format(outline=outline_dict, utterances=response.utterances)
             conversation_pieces.append(full_response)
+            if on_segment_ready:
+                on_segment_ready(i, full_response.utterances)
             
-            new_entities = [entity for utterance in response.utterances for entity in utterance.entities]
+            previous_summary, new_entities = segment_handoff(response, full_response, previous_entities, use_cache)
             previous_entities.extend(new_entities)
             segment_info["previous_entities"] = previous_entities
             
-            previous_summary = generate_segment_summary(full_response)
-            
         except Exception as e:
             st.error(f"Error during LLM call for prompt '{prompt}': {e}")
             conversation_pieces.append(final_format(outline=outline_dict, utterances=[]))
 
+        if on_segment_done:
+            on_segment_done(i + 1, len(prompts))
+
+    get_length_controller().save()
     return conversation_pieces
 
+async def _fetch_segment_async(client, semaphore, segment_prompt, route, response_format, use_cache, max_tokens=4096, on_fresh=None):
+    async with semaphore:
+        return await aparse_chat_completion(
+            client,
+            model=route["model"],
+            messages=[
+                {"role": "system", "content": segment_prompt}
+            ],
+            temperature=0.7,
+            top_p=0.7,
+            max_tokens=max_tokens,
+            response_format=response_format,
+            use_cache=use_cache,
+            route=route,
+            on_fresh=on_fresh
+        )
+
+async def _fetch_conversation_responses_async(context, prompts, outline, route, max_concurrency, segments, on_segment_done, use_cache, on_segment_ready=None, reused_segments=None):
+    client = get_async_openai_client()
+    semaphore = asyncio.Semaphore(max_concurrency)
+    model = route["model"]
+
+    segment_info = st.session_state.get("conversation_splits", {
+        "total_splits": 1,
+        "current_split": 0,
+        "num_speakers": outline.num_speakers
+    })
+
+    response_format = get_response_format(outline.num_speakers)
+    reused_segments = reused_segments or {}
+
+    done = len(reused_segments)
+    async def track(i, task):
+        nonlocal done
+        try:
+            response = await task
+            if on_segment_ready:
+                on_segment_ready(i, response.utterances)
+            return response
+        finally:
+            done += 1
+            if on_segment_done:
+                on_segment_done(done, len(prompts))
+
+    tasks = []
+    task_indexes = []
+    for i, prompt in enumerate(prompts):
+        if i in reused_segments:
+            continue
+        handoff_summary, previous_entities = create_handoff_context(outline, i, segments)
+        section_info = dict(
+            segment_info,
+            current_split=i,
+            total_splits=len(prompts),
+            previous_entities=previous_entities
+        )
+        max_tokens = apply_length_plan(section_info, segments[i] if segments else None, model, route["max_tokens"] or 4096)
+        segment_prompt = create_segment_prompt(context, prompt, section_info, handoff_summary)
+        tasks.append(track(
+            i,
+            _fetch_segment_async(
+                client, semaphore, segment_prompt, route, response_format, use_cache, max_tokens,
+                segment_recorder(model, section_info.get("target_words"))
+            )
+        ))
+        task_indexes.append(i)
+
+    # gather() keeps the results in prompt order regardless of completion order;
+    # reused segments are left as None
+    results = [None] * len(prompts)
+    for i, response in zip(task_indexes, await asyncio.gather(*tasks, return_exceptions=True)):
+        results[i] = response
+    return results
+
+def fetch_conversation_responses_concurrently(context, prompts, outline: TopicOutline, model=None, segments=None, on_segment_done=None, use_cache=True, max_concurrency=None, on_segment_ready=None, reused_segments=None) -> list[Conversation | Monologue]:
+    """
+    Fetch conversation responses for all prompts in parallel.
+
+    Unlike fetch_conversation_responses, no segment waits for the previous one: continuity
+    comes from hand-off context derived from the outline instead of a live summary of the
+    previously generated segment, so wall-clock time follows the slowest section.
+
+    Args:
+        context (str): The context for the conversation.
+        prompts (list): List of user prompts, one per segment.
+        outline (TopicOutline): The outline of the conversation.
+        model (str): The OpenAI model to use for generating responses (defaults to the
+            conversation_segment route of the active profile, see utils.model_routing).
+        segments (list): Planned segments matching the prompts (see utils.segment_planner).
+        on_segment_done (callable): Called as on_segment_done(done, total) after each segment.
+        use_cache (bool): Reuse cached responses for unchanged requests (see utils.llm_cache).
+        max_concurrency (int): Maximum number of in-flight requests
+            (defaults to generation.max_concurrency in config.yaml).
+        on_segment_ready (callable): Called as on_segment_ready(index, utterances) as soon as
+            a segment has been generated, in completion order.
+        reused_segments (dict): {segment index: utterances} of segments to reuse instead of
+            generating them (see utils.section_fingerprints).
+
+    Returns:
+        list: A list of conversation pieces, in the same order as the prompts.
+    """
+    if max_concurrency is None:
+        max_concurrency = get_setting("generation", "max_concurrency", 8)
+
+    # Resolved here: the sidebar profile is not visible from the event loop's thread
+    route = get_route("conversation_segment", model=model)
+    outline_dict = outline.model_dump()
+    final_format = Monologue if outline.num_speakers == 1 else Conversation
+    reused_segments = reused_segments or {}
+    if on_segment_ready:
+        for i, utterances in reused_segments.items():
+            on_segment_ready(i, utterances)
+
+    responses = run_async(
+        _fetch_conversation_responses_async(
+            context, prompts, outline, route, max(1, int(max_concurrency)), segments, on_segment_done, use_cache,
+            on_segment_ready, reused_segments
+        )
+    )
+
+    get_length_controller().save()
+    conversation_pieces = []
+    for i, (prompt, response) in enumerate(zip(prompts, responses)):
+        if i in reused_segments:
+            conversation_pieces.append(final_format(outline=outline_dict, utterances=reused_segments[i]))
+        elif isinstance(response, Exception):
+            st.error(f"Error during LLM call for prompt '{prompt}': {response}")
+            conversation_pieces.append(final_format(outline=outline_dict, utterances=[]))
+        else:
+            conversation_pieces.append(final_format(outline=outline_dict, utterances=response.utterances))
+
+    return conversation_pieces
+
+def stream_segment_utterances(client, model, messages, response_format, use_cache=True, route=None, on_fresh=None, **params):
+    """
+    Streams a structured-output completion and yields each utterance as soon as it is complete.
+
+    The partial JSON of the response is parsed on every delta; an utterance is complete as soon
+    as the next one has started, and the last one when the stream ends.
+
+    Args:
+        client (openai.OpenAI): The OpenAI client.
+        model (str): The OpenAI model to use for generating responses (defaults to the
+            conversation_segment route of the active profile, see utils.model_routing).
+        messages (list): The messages of the request.
+        response_format: ConversationResponse or MonologueResponse, or their *HandoffResponse variants.
+        use_cache (bool): Reuse a cached response for an unchanged request (see utils.llm_cache).
+        route (dict): Sets the timeout and records the latency (see utils.model_routing).
+        on_fresh (callable): Called with the complete response unless it came from the cache.
+        **params: The remaining request parameters (temperature, max_tokens, ...).
+
+    Yields:
+        ConversationUtterance | MonologueUtterance: The utterances, in order.
+
+    Returns:
+        The complete parsed response, as the value of the generator's StopIteration.
+    """
+    cache_key = make_cache_key(model, messages, response_format, **params)
+    if use_cache:
+        cached = lookup_completion(cache_key, response_format)
+        if cached is not None:
+            yield from cached.utterances
+            return cached
+
+    utterance_format = get_args(response_format.model_fields["utterances"].annotation)[0]
+    client = with_route_timeout(client, route)
+    limiter = get_rate_limiter(model)
+    tokens = estimate_request_tokens(model, messages, params.get("max_tokens"))
+    max_attempts = get_setting("retries", "max_attempts", 6)
+    utterances = []
+    for attempt in range(max_attempts):
+        limiter.acquire(tokens)
+        start = time.monotonic()
+        # Time the caller spends between utterances is not part of the call's latency
+        paused = 0.0
+        try:
+            with client.beta.chat.completions.stream(
+                model=model,
+                messages=messages,
+                response_format=response_format,
+                **params
+            ) as stream:
+                for event in stream:
+                    if event.type != "content.delta" or not event.parsed:
+                        continue
+                    partial_utterances = event.parsed.get("utterances") or []
+                    while len(utterances) < len(partial_utterances) - 1:
+                        utterance = utterance_format.model_validate(partial_utterances[len(utterances)])
+                        utterances.append(utterance)
+                        yielded = time.monotonic()
+                        yield utterance
+                        paused += time.monotonic() - yielded
+                response = stream.get_final_completion().choices[0].message.parsed
+            if route:
+                record_latency(route, time.monotonic() - start - paused)
+            break
+        except Exception as e:
+            # Utterances already shown cannot be taken back, so only retry before the first one
+            if utterances or attempt == max_attempts - 1 or not is_retryable(e):
+                raise
+            delay = retry_delay(e, attempt)
+            limiter.note_failure(e, delay)
+            time.sleep(delay)
+
+    for utterance in response.utterances[len(utterances):]:
+        utterances.append(utterance)
+        yield utterance
+
+    if on_fresh:
+        on_fresh(response)
+    if use_cache:
+        store_completion(cache_key, response)
+    return response
+
+def stream_conversation_responses(context, prompts, outline: TopicOutline, model=None, segments=None, use_cache=True, reused_segments=None):
+    """
+    Like fetch_conversation_responses, but yields every utterance as soon as it is complete
+    instead of returning whole segments at the end.
+
+    Args:
+        context (str): The context for the conversation.
+        prompts (list): List of user prompts, one per segment.
+        outline (TopicOutline): The outline of the conversation.
+        model (str): The OpenAI model to use for generating responses (defaults to the
+            conversation_segment route of the active profile, see utils.model_routing).
+        segments (list): Planned segments matching the prompts (see utils.segment_planner).
+        use_cache (bool): Reuse cached responses for unchanged requests (see utils.llm_cache).
+        reused_segments (dict): {segment index: utterances} of segments to reuse instead of
+            generating them (see utils.section_fingerprints).
+
+    Yields:
+        tuple: (segment index, utterance), in conversation order.
+    """
+    client = get_openai_client()
+    route = get_route("conversation_segment", model=model)
+    model = route["model"]
+    self_summarize = get_setting("generation", "self_summarize", True)
+    previous_summary = None
+    previous_entities = []
+
+    segment_info = st.session_state.get("conversation_splits", {
+        "total_splits": 1,
+        "current_split": 0,
+        "num_speakers": outline.num_speakers
+    })
+
+    outline_dict = outline.model_dump()
+    response_format = get_response_format(outline.num_speakers, self_summarize)
+    final_format = Monologue if outline.num_speakers == 1 else Conversation
+
+    reused_segments = reused_segments or {}
+
+    for i, prompt in enumerate(prompts):
+        segment_info["current_split"] = i
+        segment_info["total_splits"] = len(prompts)
+        segment_info["previous_entities"] = previous_entities
+
+        if i in reused_segments:
+            for utterance in reused_segments[i]:
+                yield i, utterance
+            previous_summary, new_entities = reused_segment_handoff(outline, i, segments, reused_segments[i], previous_entities)
+            previous_entities.extend(new_entities)
+            continue
+
+        max_tokens = apply_length_plan(segment_info, segments[i] if segments else None, model, route["max_tokens"] or 4096)
+
+        segment_prompt = create_segment_prompt(context, prompt, segment_info, previous_summary, with_handoff=self_summarize)
+        utterances = []
+        try:
+            stream = stream_segment_utterances(
+                client,
+                model=model,
+                messages=[
+                    {"role": "system", "content": segment_prompt}
+                ],
+                response_format=response_format,
+                use_cache=use_cache,
+                route=route,
+                on_fresh=segment_recorder(model, segment_info.get("target_words")),
+                temperature=0.7,
+                top_p=0.7,
+                max_tokens=max_tokens
+            )
+            while True:
+                try:
+                    utterance = next(stream)
+                except StopIteration as stop:
+                    response = stop.value
+                    break
+                utterances.append(utterance)
+                yield i, utterance
+
+            previous_summary, new_entities = segment_handoff(
+                response,
+                final_format(outline=outline_dict, utterances=utterances),
+                previous_entities,
+                use_cache
+            )
+            previous_entities.extend(new_entities)
+
+        except Exception as e:
+            st.error(f"Error during LLM call for prompt '{prompt}': {e}")
+
+    get_length_controller().save()
+
 def fetch_fake_conversation_responses(context, prompts):
     conversation_pieces = []
     for i, prompt in enumerate(prompts):
@@ -96,7 +476,8 @@ def get_image_from_url(url):
     Returns:
         bytes: The binary data of the image.
     """
-    response = requests.get(url)
+    response = get_http_session().get(url)
+    response.raise_for_status()
     return response.content
 
 def generate_images_with_dalle(prompts, stop_signal, api_key):
@@ -111,9 +492,7 @@ def generate_images_with_dalle(prompts, stop_signal, api_key):
     Returns:
         list: A list of generated image data (binary).
     """
-    openai.api_key = api_key
-    generated_images = []
-    client = openai.OpenAI()
+    client = get_openai_client(api_key)
     generated_images = []
     image_urls = []
 
@@ -121,12 +500,15 @@ def generate_images_with_dalle(prompts, stop_signal, api_key):
         if stop_signal.get("abort"):
             break
         try:
-            response = client.images.generate(
-                model="dall-e-3",
-                prompt=prompt, 
-                n=1, 
-                size="1792x1024"
-                )
+            response = call_with_retries(
+                lambda: client.images.generate(
+                    model="dall-e-3",
+                    prompt=prompt,
+                    n=1,
+                    size="1792x1024"
+                ),
+                "dall-e-3"
+            )
             image_url = response.data[0].url
             image_urls.append(image_url)
             generated_images.append((prompt, get_image_from_url(image_url)))
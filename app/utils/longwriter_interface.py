@@ -1,13 +1,21 @@
 import os
-import requests
 from typing import List, Tuple
 import json
+import hashlib
 from datetime import datetime
+from utils.llm_cache import make_cache_key, lookup_completion, store_completion
+from utils.openai_utils import get_http_session
+from utils.rate_limiter import call_with_retries, estimate_request_tokens, get_rate_limiter
+from utils.config import get_setting
+from utils.rolling_context import RollingContext
+from utils.persistence import load_checkpoint, save_checkpoint, delete_checkpoint
+from utils.model_routing import get_route, timed_call
 
 # Load templates
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PLAN_PATH = os.path.join(BASE_DIR, "..", "agentwrite", "prompts", "plan.txt")
 WRITE_PATH = os.path.join(BASE_DIR, "..", "agentwrite", "prompts", "write.txt")
+SUMMARIZE_PATH = os.path.join(BASE_DIR, "..", "agentwrite", "prompts", "summarize.txt")
 
 with open(PLAN_PATH, "r", encoding="utf-8") as f:
     PLAN_TEMPLATE = f.read()
@@ -15,59 +23,158 @@ with open(PLAN_PATH, "r", encoding="utf-8") as f:
 with open(WRITE_PATH, "r", encoding="utf-8") as f:
     WRITE_TEMPLATE = f.read()
 
+with open(SUMMARIZE_PATH, "r", encoding="utf-8") as f:
+    SUMMARIZE_TEMPLATE = f.read()
+
 # OpenAI setup
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-GPT_MODEL = "gpt-4o-2024-05-13"
 
-def call_openai_api(prompt: str, max_tokens: int = 1024, temperature: float = 1.0) -> str:
+def call_openai_api(prompt: str, call_site: str, max_tokens: int = None, temperature: float = 1.0, use_cache: bool = True) -> str:
+    """
+    Model, max_tokens (unless given) and timeout come from the call site's route in the
+    active profile (see utils.model_routing).
+    """
+    route = get_route(call_site)
+    model = route["model"]
+    max_tokens = max_tokens or route["max_tokens"] or 1024
     headers = {"Authorization": f"Bearer {OPENAI_API_KEY}"}
     payload = {
-        "model": GPT_MODEL,
+        "model": model,
         "messages": [{"role": "user", "content": prompt}],
         "temperature": temperature,
         "max_tokens": max_tokens
     }
 
-    for _ in range(5):
-        try:
-            response = requests.post(
+    cache_key = make_cache_key(model, payload["messages"], temperature=temperature, max_tokens=max_tokens)
+    if use_cache:
+        cached = lookup_completion(cache_key)
+        if cached is not None:
+            return cached
+
+    def post():
+        with timed_call(route):
+            response = get_http_session().post(
                 "https://api.openai.com/v1/chat/completions",
                 headers=headers,
                 json=payload,
-                timeout=600
+                timeout=route["timeout"] or 600
             )
             response.raise_for_status()
-            return response.json()["choices"][0]["message"]["content"]
-        except Exception as e:
-            print(f"Retrying after error: {e}")
-    return "Error: Failed after retries"
+            return response.json()
 
-def generate_paragraph_plan(instruction: str) -> List[str]:
+    tokens = estimate_request_tokens(model, payload["messages"], max_tokens)
+    try:
+        completion = call_with_retries(post, model, tokens, max_attempts=5)
+    except Exception as e:
+        print(f"Giving up after error: {e}")
+        return "Error: Failed after retries"
+
+    get_rate_limiter(model).release(tokens, completion.get("usage", {}).get("total_tokens"))
+    content = completion["choices"][0]["message"]["content"]
+    if use_cache:
+        store_completion(cache_key, content)
+    return content
+
+def generate_paragraph_plan(instruction: str, use_cache: bool = True) -> List[str]:
     prompt = PLAN_TEMPLATE.replace("$INST$", instruction)
-    response = call_openai_api(prompt)
+    response = call_openai_api(prompt, "longwriter_plan", use_cache=use_cache)
     return [line.strip() for line in response.split("\n") if line.strip()]
 
-def generate_longwriter_output(instruction: str) -> Tuple[str, List[str]]:
+def summarize_paragraph(summary: str, paragraph: str, max_tokens: int, use_cache: bool = True) -> str:
     """
+    Returns the running story summary with the paragraph folded in.
+    """
+    prompt = (
+        SUMMARIZE_TEMPLATE
+        .replace("$SUMMARY$", summary or "(nothing yet)")
+        .replace("$PARAGRAPH$", paragraph)
+        .replace("$WORDS$", str(int(max_tokens / 1.3)))
+    )
+    result = call_openai_api(prompt, "longwriter_summary", max_tokens=max_tokens, temperature=0.3, use_cache=use_cache)
+    if result.startswith("Error:"):
+        # Keep the old summary rather than feeding the error text to later steps
+        return summary
+    return result
+
+def checkpoint_name(instruction: str) -> str:
+    return "longwriter/" + hashlib.sha256(instruction.encode("utf-8")).hexdigest()
+
+def generate_longwriter_output(instruction: str, use_cache: bool = True, compact_context: bool = None, on_step_done=None) -> Tuple[str, List[str]]:
+    """
+    The plan and every written paragraph are checkpointed through utils.persistence as
+    they complete, so re-running the same instruction after an interruption resumes after
+    the last completed step instead of starting over. The checkpoint is removed once the
+    story is complete, and ignored when use_cache is False.
+
+    Args:
+        instruction: The writing instruction.
+        use_cache: Set to False to bypass the LLM response cache.
+        compact_context: Give each step the last few paragraphs plus a running summary of
+            the earlier ones instead of the whole text so far, which keeps the prompt size
+            flat for long stories. Defaults to longwriter.compact_context in config.yaml.
+        on_step_done: Called as on_step_done(done, total) after each plan step.
+
     Returns:
         - full generated story (str)
         - list of plan steps used (List[str])
     """
-    plan_steps = generate_paragraph_plan(instruction)
-    full_text = ""
+    if compact_context is None:
+        compact_context = get_setting("longwriter", "compact_context", True)
+
+    name = checkpoint_name(instruction)
+    # Without the cache the story is generated afresh rather than resumed
+    checkpoint = load_checkpoint(name) if use_cache else None
+    if checkpoint and checkpoint.get("instruction") == instruction and checkpoint.get("plan_steps"):
+        plan_steps = checkpoint["plan_steps"]
+        paragraphs = checkpoint.get("paragraphs", [])
+        print(f"Resuming LongWriter after step {len(paragraphs)} of {len(plan_steps)}")
+    else:
+        plan_steps = generate_paragraph_plan(instruction, use_cache=use_cache)
+        if not plan_steps or plan_steps[0].startswith("Error:"):
+            raise RuntimeError(f"Planning failed: {plan_steps[0] if plan_steps else 'empty plan'}")
+        paragraphs = []
+        checkpoint = {"instruction": instruction, "plan_steps": plan_steps, "paragraphs": paragraphs}
+        save_checkpoint(name, checkpoint)
+
+    full_text = "".join(paragraph.strip() + "\n\n" for paragraph in paragraphs)
     plan_str = "\n".join(plan_steps)
+    context = RollingContext(
+        lambda summary, paragraph, max_tokens: summarize_paragraph(summary, paragraph, max_tokens, use_cache),
+        keep_paragraphs=get_setting("longwriter", "keep_paragraphs", 3),
+        max_tokens=get_setting("longwriter", "context_tokens", 3000),
+        summary_tokens=get_setting("longwriter", "summary_tokens", 400)
+    )
+    if compact_context:
+        if checkpoint.get("context") is not None:
+            context.load_state(checkpoint["context"])
+        else:
+            for paragraph in paragraphs:
+                context.add(paragraph)
 
-    for step in plan_steps:
+    for step in plan_steps[len(paragraphs):]:
         prompt = (
             WRITE_TEMPLATE
             .replace("$INST$", instruction)
             .replace("$PLAN$", plan_str.strip())
-            .replace("$TEXT$", full_text.strip())
+            .replace("$TEXT$", context.render() if compact_context else full_text.strip())
             .replace("$STEP$", step)
         )
-        paragraph = call_openai_api(prompt)
+        paragraph = call_openai_api(prompt, "longwriter_paragraph", use_cache=use_cache)
+        if paragraph.startswith("Error:"):
+            # Stop here so a re-run retries this step instead of keeping the error text
+            raise RuntimeError(f"Writing step {len(paragraphs) + 1} of {len(plan_steps)} failed: {paragraph}")
         full_text += paragraph.strip() + "\n\n"
+        if compact_context:
+            context.add(paragraph)
+
+        paragraphs.append(paragraph)
+        checkpoint["context"] = context.state() if compact_context else None
+        save_checkpoint(name, checkpoint)
+        if on_step_done:
+            on_step_done(len(paragraphs), len(plan_steps))
 
+    # The checkpoint is only there to resume an interrupted run
+    delete_checkpoint(name)
     return full_text.strip(), plan_steps
 
 
@@ -0,0 +1,113 @@
+import os
+import sys
+import json
+import time
+import threading
+from utils.config import get_setting, load_config, resolve_local_path
+
+PROFILES = ["fast", "balanced", "quality"]
+
+_lock = threading.Lock()
+_latencies = {}
+
+def active_profile():
+    """
+    Returns the routing profile: the one picked in the sidebar when running inside the app,
+    MODEL_PROFILE from the environment for scripts, or routing.profile in config.yaml.
+    """
+    st = sys.modules.get("streamlit")
+    if st is not None:
+        from streamlit import runtime
+        if runtime.exists() and st.session_state.get("model_profile"):
+            return st.session_state["model_profile"]
+    return os.getenv("MODEL_PROFILE") or get_setting("routing", "profile", "balanced")
+
+def get_route(call_site, profile=None, model=None):
+    """
+    Returns {"call_site", "profile", "model", "max_tokens", "timeout"} for a call site.
+
+    Settings come from routing.profiles.<profile>.<call_site> in config.yaml, falling back
+    to the profile's default entry; max_tokens and timeout are None when not configured.
+    An explicit model overrides the profile's.
+    Resolve routes on the script thread: the sidebar profile is not visible from worker threads.
+    """
+    profile = profile or active_profile()
+    profiles = (load_config().get("routing") or {}).get("profiles") or {}
+    settings = profiles.get(profile) or {}
+    route = {"model": "gpt-4o", "max_tokens": None, "timeout": None}
+    route.update(settings.get("default") or {})
+    route.update(settings.get(call_site) or {})
+    if model:
+        route["model"] = model
+    route["call_site"] = call_site
+    route["profile"] = profile
+    return route
+
+def with_route_timeout(client, route):
+    """
+    Returns the OpenAI client with the route's timeout applied, if it has one.
+    """
+    if route and route.get("timeout"):
+        return client.with_options(timeout=route["timeout"])
+    return client
+
+def record_latency(route, seconds):
+    """
+    Records the latency of one API call (cache hits are not calls) made for a route.
+    """
+    key = (route["profile"], route["call_site"], route["model"])
+    with _lock:
+        stats = _latencies.setdefault(key, {"calls": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+        stats["calls"] += 1
+        stats["total_seconds"] += seconds
+        stats["max_seconds"] = max(stats["max_seconds"], seconds)
+
+    log_path = get_setting("routing", "latency_log", ".cache/latency.jsonl")
+    if log_path:
+        log_path = resolve_local_path(log_path)
+        record = {"time": time.time(), "profile": route["profile"], "call_site": route["call_site"],
+                  "model": route["model"], "seconds": round(seconds, 3)}
+        try:
+            os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+            with _lock, open(log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            print(f"Could not write latency log {log_path}: {e}")
+
+def get_latency_metrics():
+    """
+    Returns {profile: {call_site: {model, calls, mean_seconds, max_seconds}}} for this process.
+    """
+    with _lock:
+        latencies = dict(_latencies)
+    metrics = {}
+    for (profile, call_site, model), stats in sorted(latencies.items()):
+        metrics.setdefault(profile, {})[call_site] = {
+            "model": model,
+            "calls": stats["calls"],
+            "mean_seconds": round(stats["total_seconds"] / stats["calls"], 2),
+            "max_seconds": round(stats["max_seconds"], 2),
+        }
+    return metrics
+
+class timed_call:
+    """
+    Context manager that records the latency of the API call in its block if it succeeds:
+
+        with timed_call(get_route("longwriter_paragraph")):
+            ...
+
+    Wrap a single attempt, inside call_with_retries, so rate-limiter waits and retry backoff
+    are not counted. Does nothing when route is None.
+    """
+
+    def __init__(self, route):
+        self.route = route
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None and self.route:
+            record_latency(self.route, time.monotonic() - self.start)
@@ -0,0 +1,108 @@
+"""
+Joins MP3 clips at the bitstream level, without decoding or re-encoding.
+
+MPEG audio is a sequence of self-contained frames, so clips with the same codec parameters
+can be joined by concatenating their frames. Per-clip metadata is dropped on the way: ID3v2
+tags at the start, ID3v1 tags at the end and the Xing/Info/VBRI header frame, whose frame
+count and seek table would only describe the first clip.
+"""
+
+# Layer III bitrates in kbps by bitrate index, for MPEG-1 and for MPEG-2/2.5
+_BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_SAMPLE_RATES = [44100, 48000, 32000]
+# Version bits -> (MPEG version, sample rate divisor)
+_VERSIONS = {3: (1, 1), 2: (2, 2), 0: (2.5, 4)}
+
+def _parse_header(data, position):
+    """
+    Returns (frame length, (version, sample rate, channel mode)) of the Layer III frame
+    header at position, or None if there is no valid header there.
+    """
+    if position + 4 > len(data) or data[position] != 0xFF or data[position + 1] & 0xE0 != 0xE0:
+        return None
+    b1, b2, b3 = data[position + 1], data[position + 2], data[position + 3]
+    version_bits, layer_bits = (b1 >> 3) & 3, (b1 >> 1) & 3
+    bitrate_index, sample_rate_index = b2 >> 4, (b2 >> 2) & 3
+    if version_bits not in _VERSIONS or layer_bits != 1 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    version, divisor = _VERSIONS[version_bits]
+    bitrate = _BITRATES[1 if version == 1 else 2][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[sample_rate_index] // divisor
+    padding = (b2 >> 1) & 1
+    length = (144 if version == 1 else 72) * bitrate // sample_rate + padding
+    return length, (version, sample_rate, b3 >> 6)
+
+def _strip_tags(data):
+    if data[:3] == b"ID3" and len(data) >= 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        footer = 10 if data[5] & 0x10 else 0
+        data = data[10 + size + footer:]
+    if len(data) >= 128 and data[-128:-125] == b"TAG":
+        data = data[:-128]
+    return data
+
+def _is_info_frame(frame, params):
+    version, _, channel_mode = params
+    mono = channel_mode == 3
+    # The Xing/Info tag follows the side information, whose size depends on version and channels
+    offset = 4 + ((17 if mono else 32) if version == 1 else (9 if mono else 17))
+    return frame[offset:offset + 4] in (b"Xing", b"Info") or frame[36:40] == b"VBRI"
+
+def mp3_frames(data):
+    """
+    Returns (the audio frames of an MP3 clip as bytes, their (version, sample rate,
+    channel mode)), without tags, the info frame and any incomplete trailing frame.
+
+    Raises:
+        ValueError: If the clip holds no MPEG Layer III frames or mixes codec parameters.
+    """
+    data = _strip_tags(bytes(data))
+    frames = []
+    clip_params = None
+    position = 0
+    while position < len(data):
+        header = _parse_header(data, position)
+        if header is None:
+            # Skip junk between frames
+            position = data.find(b"\xff", position + 1)
+            if position == -1:
+                break
+            continue
+        length, params = header
+        if position + length > len(data):
+            break
+        frame = data[position:position + length]
+        if clip_params is None:
+            clip_params = params
+            if _is_info_frame(frame, params):
+                position += length
+                continue
+        elif params != clip_params:
+            raise ValueError(f"MP3 clip changes codec parameters from {clip_params} to {params}")
+        frames.append(frame)
+        position += length
+    if not frames:
+        raise ValueError("No MPEG Layer III frames found")
+    return b"".join(frames), clip_params
+
+def join_mp3(clips):
+    """
+    Returns the clips (MP3 bytes) joined into one MP3 stream.
+
+    Raises:
+        ValueError: If a clip is not MPEG Layer III or the clips differ in version, sample
+            rate or channel mode; such clips have to be decoded and re-encoded instead.
+    """
+    joined = []
+    joined_params = None
+    for clip in clips:
+        frames, params = mp3_frames(clip)
+        if joined_params is None:
+            joined_params = params
+        elif params != joined_params:
+            raise ValueError(f"MP3 clips differ in codec parameters: {joined_params} and {params}")
+        joined.append(frames)
+    return b"".join(joined)
@@ -1,9 +1,144 @@
 import os
+import sys
+import asyncio
+import threading
+import weakref
+import httpx
 import openai
-import streamlit as st
+import requests
+from requests.adapters import HTTPAdapter
+from utils.config import get_setting
 
-def get_openai_client():
-    if "OPENAI_API_KEY" not in st.session_state or not st.session_state["OPENAI_API_KEY"]:
-        raise ValueError("OpenAI API Key is not set in session_state.")
-    os.environ["OPENAI_API_KEY"] = st.session_state["OPENAI_API_KEY"]
-    return openai.OpenAI()
+_lock = threading.Lock()
+_clients = {}
+_async_clients = weakref.WeakKeyDictionary()
+_http_session = None
+
+class _TimeoutHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that applies a default timeout to requests made without one.
+    """
+    def __init__(self, timeout, **kwargs):
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().send(request, **kwargs)
+
+def _reset_after_fork():
+    # Pooled connections must not be shared with a forked child process
+    global _lock, _http_session
+    _lock = threading.Lock()
+    _clients.clear()
+    _async_clients.clear()
+    _http_session = None
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+def get_api_key(api_key=None):
+    """
+    Returns api_key if given, the key of the current Streamlit session when running inside
+    the app, or OPENAI_API_KEY from the environment for scripts.
+    """
+    if api_key:
+        return api_key
+    st = sys.modules.get("streamlit")
+    if st is not None:
+        from streamlit import runtime
+        if runtime.exists():
+            if "OPENAI_API_KEY" not in st.session_state or not st.session_state["OPENAI_API_KEY"]:
+                raise ValueError("OpenAI API Key is not set in session_state.")
+            return st.session_state["OPENAI_API_KEY"]
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("Missing OpenAI API Key!")
+    return api_key
+
+def _pool_limits(pool_size=None):
+    pool_size = pool_size or get_setting("openai", "pool_size", 32)
+    return httpx.Limits(
+        max_connections=pool_size,
+        max_keepalive_connections=pool_size,
+        keepalive_expiry=get_setting("openai", "keepalive_expiry", 60)
+    )
+
+def _timeout():
+    return httpx.Timeout(
+        get_setting("openai", "timeout", 600),
+        connect=get_setting("openai", "connect_timeout", 10)
+    )
+
+def get_openai_client(api_key=None):
+    """
+    Returns the process-wide OpenAI client for the API key, with a pooled keep-alive transport.
+    """
+    api_key = get_api_key(api_key)
+    with _lock:
+        if api_key not in _clients:
+            _clients[api_key] = openai.OpenAI(
+                api_key=api_key,
+                max_retries=get_setting("openai", "max_retries", 0),
+                http_client=httpx.Client(limits=_pool_limits(), timeout=_timeout())
+            )
+        return _clients[api_key]
+
+def get_async_openai_client(api_key=None, pool_size=None):
+    """
+    Returns the AsyncOpenAI client for the API key and the running event loop.
+
+    Async connection pools are bound to the event loop they were opened on, so clients
+    are shared per loop; run the loop with run_async() to close them when it ends. pool_size overrides
+    openai.pool_size for callers that keep many more requests in flight.
+    """
+    api_key = get_api_key(api_key)
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        if (api_key, pool_size) not in clients:
+            clients[(api_key, pool_size)] = openai.AsyncOpenAI(
+                api_key=api_key,
+                max_retries=get_setting("openai", "max_retries", 0),
+                http_client=httpx.AsyncClient(limits=_pool_limits(pool_size), timeout=_timeout())
+            )
+        return clients[(api_key, pool_size)]
+
+async def _close_async_clients():
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.pop(loop, {})
+    for client in clients.values():
+        await client.close()
+
+def run_async(coro):
+    """
+    asyncio.run() that closes the AsyncOpenAI clients of its event loop before the loop
+    is torn down, so their connection pools do not outlive it.
+    """
+    async def main():
+        try:
+            return await coro
+        finally:
+            await _close_async_clients()
+    return asyncio.run(main())
+
+def get_http_session():
+    """
+    Returns the process-wide requests.Session for raw HTTP calls (TTS, image downloads, ...),
+    with pooled keep-alive connections and a default timeout.
+    """
+    global _http_session
+    with _lock:
+        if _http_session is None:
+            pool_size = get_setting("openai", "pool_size", 32)
+            adapter = _TimeoutHTTPAdapter(
+                timeout=(get_setting("openai", "connect_timeout", 10), get_setting("openai", "timeout", 600)),
+                pool_connections=pool_size,
+                pool_maxsize=pool_size
+            )
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _http_session = session
+        return _http_session
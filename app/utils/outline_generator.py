@@ -1,12 +1,20 @@
+import asyncio
 import streamlit as st
-from utils.data_models import TopicOutline, Section, Speaker
-from utils.openai_utils import get_openai_client
+from utils.data_models import TopicOutline, Section, Speaker, OutlineSkeleton, OutlinePatch
+from utils.openai_utils import get_openai_client, get_async_openai_client, run_async
 from utils.token_estimator import TokenEstimator
+from utils.llm_cache import parse_chat_completion, aparse_chat_completion
+from utils.config import get_setting
+from utils.model_routing import get_route
 
-def generate_outline_prompt(topic, length, num_speakers, document_context=None):
-    image_prompt_details = st.session_state.get("image_prompt_details", "")
-    images_per_point = st.session_state.get("images_per_point", 5)
-    
+OUTLINE_SYSTEM_PROMPT = """You are a content creator. Your task is to create a detailed outline 
+    for a conversation or monologue that accurately reflects the content and context of the provided document.
+    Focus on the main themes and key points from the document context."""
+
+def plan_outline_sections(length, num_speakers):
+    """
+    Returns the number of outline sections for the length and records the split in the session.
+    """
     estimator = TokenEstimator()
     num_splits = estimator.estimate_conversation_splits(length)
     tokens_per_split = estimator.get_tokens_per_split(length, num_splits)
@@ -17,11 +25,16 @@ def generate_outline_prompt(topic, length, num_speakers, document_context=None):
         "current_split": 0,
         "num_speakers": num_speakers
     }
+    return num_splits
+
+def generate_outline_prompt(topic, length, num_speakers, document_context=None):
+    image_prompt_details = st.session_state.get("image_prompt_details", "")
+    images_per_point = st.session_state.get("images_per_point", 5)
+    
+    num_splits = plan_outline_sections(length, num_speakers)
 
     prompt = dict()
-    prompt["system"] = """You are a content creator. Your task is to create a detailed outline 
-    for a conversation or monologue that accurately reflects the content and context of the provided document.
-    Focus on the main themes and key points from the document context."""
+    prompt["system"] = OUTLINE_SYSTEM_PROMPT
     
     base_prompt = f"""
     Create a {length}-minute conversation/monologue outline.
@@ -57,23 +70,177 @@ def generate_outline_prompt(topic, length, num_speakers, document_context=None):
 
     return prompt
 
-def generate_outline(prompt, model="gpt-4o"):
+def generate_outline(prompt, model=None, use_cache=True):
+    route = get_route("outline", model=model)
     client = get_openai_client()
     length = st.session_state.get("length", 10)
     num_speakers = st.session_state.get("num_speakers", 2)
     
-    completion = client.beta.chat.completions.parse(
-        model=model,
+    outline = parse_chat_completion(
+        client,
+        model=route["model"],
         messages=[
             {"role": "system", "content": prompt["system"]},
             {"role": "user", "content": prompt["user"]},
         ],
-        response_format=TopicOutline
+        response_format=TopicOutline,
+        use_cache=use_cache,
+        route=route
     )
-    outline = completion.choices[0].message.parsed
     outline.length_minutes = length
     return outline
 
+def generate_skeleton_prompt(topic, length, num_speakers, document_context=None):
+    """
+    Prompt for the first phase of a two-phase outline: context, speakers and section foci only.
+    """
+    num_splits = plan_outline_sections(length, num_speakers)
+
+    prompt = dict()
+    prompt["system"] = OUTLINE_SYSTEM_PROMPT
+    prompt["user"] = f"""
+    Create the skeleton of a {length}-minute conversation/monologue outline.
+    Number of speakers: {num_speakers}
+    Topic: {topic}
+    """
+
+    if document_context:
+        prompt["user"] += f"""
+        DOCUMENT CONTEXT:
+        {document_context}
+
+        Instructions:
+        - Extract and focus on the main themes and key concepts from the document
+        - Organize the sections around these core themes
+        """
+
+    prompt["user"] += f"""
+    Requirements:
+    - Write the context and the speakers
+    - Create {num_splits} main sections, each with its focus and a short brief
+    - Sections should build on each other logically without overlapping
+    - Do not write discussion points or image prompts yet; each section is expanded separately
+    - If num_speakers is 1, make it a monologue
+    """
+    return prompt
+
+def generate_section_prompt(skeleton: OutlineSkeleton, section_index, document_context=None):
+    """
+    Prompt for the second phase of a two-phase outline: one section expanded in full.
+    """
+    image_prompt_details = st.session_state.get("image_prompt_details", "")
+    images_per_point = st.session_state.get("images_per_point", 5)
+    section = skeleton.sections[section_index]
+    all_sections = "\n".join(
+        f"    {i + 1}. {plan.focus}: {plan.brief}" for i, plan in enumerate(skeleton.sections)
+    )
+    speakers = ", ".join(f"{speaker.name} ({speaker.role})" for speaker in skeleton.speakers)
+
+    prompt = dict()
+    prompt["system"] = OUTLINE_SYSTEM_PROMPT
+    prompt["user"] = f"""
+    You are expanding one section of a conversation/monologue outline.
+
+    CONTEXT:
+    {skeleton.context}
+
+    SPEAKERS:
+    {speakers}
+
+    ALL SECTIONS:
+{all_sections}
+
+    SECTION TO EXPAND: {section_index + 1}. {section.focus}
+    {section.brief}
+    """
+
+    if document_context:
+        prompt["user"] += f"""
+        DOCUMENT CONTEXT:
+        {document_context}
+
+        - Include specific references or quotes from the document where relevant
+        """
+
+    prompt["user"] += f"""
+    Requirements:
+    - Keep the focus of the section as given
+    - Include 2-3 focused discussion points, covering only this section and not the others
+    - List the entities of every discussion point and of the whole section
+    - Generate {images_per_point} image prompts per discussion point
+
+    Image prompt style: '{image_prompt_details}'
+    - Keep image prompts concise but descriptive
+    - Focus on mood, lighting, and key visual elements
+    - Avoid human figures and maps
+    - Must be suitable for Dall-E
+    """
+    return prompt
+
+async def _expand_sections_async(skeleton, document_context, route, use_cache, max_concurrency):
+    client = get_async_openai_client()
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def expand(section_index):
+        prompt = generate_section_prompt(skeleton, section_index, document_context)
+        async with semaphore:
+            return await aparse_chat_completion(
+                client,
+                model=route["model"],
+                messages=[
+                    {"role": "system", "content": prompt["system"]},
+                    {"role": "user", "content": prompt["user"]},
+                ],
+                response_format=Section,
+                use_cache=use_cache,
+                route=route
+            )
+
+    # gather() keeps the sections in outline order regardless of completion order
+    return await asyncio.gather(*(expand(i) for i in range(len(skeleton.sections))))
+
+def generate_outline_two_phase(topic, length, num_speakers, document_context=None, model=None, use_cache=True, max_concurrency=None):
+    """
+    Generates the outline in two phases: a light skeleton (context, speakers and section
+    foci) in one call, then every section expanded concurrently. Latency follows the
+    largest section instead of the whole outline.
+
+    Returns:
+        TopicOutline: The same model generate_outline returns.
+    """
+    if max_concurrency is None:
+        max_concurrency = get_setting("generation", "max_concurrency", 8)
+
+    skeleton_route = get_route("outline_skeleton", model=model)
+    skeleton_prompt = generate_skeleton_prompt(topic, length, num_speakers, document_context)
+    skeleton = parse_chat_completion(
+        get_openai_client(),
+        model=skeleton_route["model"],
+        messages=[
+            {"role": "system", "content": skeleton_prompt["system"]},
+            {"role": "user", "content": skeleton_prompt["user"]},
+        ],
+        response_format=OutlineSkeleton,
+        use_cache=use_cache,
+        route=skeleton_route
+    )
+
+    section_route = get_route("outline_section", model=model)
+    sections = run_async(
+        _expand_sections_async(skeleton, document_context, section_route, use_cache, max(1, int(max_concurrency)))
+    )
+    for plan, section in zip(skeleton.sections, sections):
+        section.focus = plan.focus
+
+    return TopicOutline(
+        context=skeleton.context,
+        sections=sections,
+        speakers=skeleton.speakers,
+        length_minutes=length,
+        num_speakers=num_speakers,
+        previous_entities=[]
+    )
+
 def generate_fake_outline(topic, length):
     outline = TopicOutline(
         context=f"This is a {length}-minute long conversation about {topic}.", 
@@ -111,4 +278,64 @@ def generate_outline_update_prompt(original_outline, user_instructions):
     INSTRUCTIONS:
     {user_instructions}
     """
-    return prompt
\ No newline at end of file
+    return prompt
+
+def generate_outline_patch_prompt(original_outline: TopicOutline, user_instructions):
+    """
+    Prompt asking for the changes to the outline as patch operations (see utils.outline_patch)
+    instead of a whole new outline.
+    """
+    sections = "\n".join(
+        f"    [{i}] {section.model_dump_json()}" for i, section in enumerate(original_outline.sections)
+    )
+    speakers = "\n".join(
+        f"    [{i}] {speaker.model_dump_json()}" for i, speaker in enumerate(original_outline.speakers)
+    )
+
+    prompt = dict()
+    prompt["system"] = "You are a conversation planner."
+    prompt["user"] = f"""
+    You are given the outline of a conversation, and a set of inquiries to make changes.
+    Instead of rewriting the outline, return the smallest list of operations that makes the changes.
+    Make sure that all changes are reflected in the context as well as in every section they affect,
+    such that the cohesion and consistency of the conversation outline remains intact.
+
+    CONTEXT:
+    {original_outline.context}
+
+    SPEAKERS (by index):
+{speakers}
+
+    SECTIONS (by index):
+{sections}
+
+    OPERATIONS:
+    - set_context: replace the context with `context`
+    - replace_text: replace `old_text` with `new_text` everywhere (context, speakers and sections), e.g. to rename someone
+    - update_section: replace the section at `index` with the complete `section`
+    - insert_section: insert the complete `section` so that it gets `index`
+    - remove_section: remove the section at `index`
+    - move_section: move the section at `index` to `to_index`
+    - update_speaker: replace the speaker at `index` with the complete `speaker`
+    - add_speaker / remove_speaker: add `speaker` / remove the speaker at `index`
+    Operations are applied in order, so indexes refer to the outline as left by the previous operations.
+    Leave every field an operation does not use null, and do not touch sections the instructions do not affect.
+
+    INSTRUCTIONS:
+    {user_instructions}
+    """
+    return prompt
+
+def generate_outline_patch(prompt, model=None, use_cache=True) -> OutlinePatch:
+    route = get_route("outline_patch", model=model)
+    return parse_chat_completion(
+        get_openai_client(),
+        model=route["model"],
+        messages=[
+            {"role": "system", "content": prompt["system"]},
+            {"role": "user", "content": prompt["user"]},
+        ],
+        response_format=OutlinePatch,
+        use_cache=use_cache,
+        route=route
+    )
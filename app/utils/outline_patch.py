@@ -0,0 +1,102 @@
+from pydantic import ValidationError
+from utils.data_models import TopicOutline, OutlinePatch, OutlineOperation
+
+class OutlinePatchError(ValueError):
+    """
+    Raised when there is no patch or an operation of it does not fit the outline it is applied to.
+    """
+
+def _replace_in(value, old, new):
+    """
+    Returns value with old replaced by new in every string it contains.
+    """
+    if isinstance(value, str):
+        return value.replace(old, new)
+    if isinstance(value, list):
+        return [_replace_in(item, old, new) for item in value]
+    if isinstance(value, dict):
+        return {key: _replace_in(item, old, new) for key, item in value.items()}
+    return value
+
+def _replace_text(model, old, new):
+    """
+    Returns the model with old replaced by new, or the model itself if it does not contain old,
+    so untouched parts of the outline stay the same objects.
+    """
+    data = model.model_dump(mode="json")
+    replaced = _replace_in(data, old, new)
+    if replaced == data:
+        return model
+    try:
+        return type(model).model_validate(replaced)
+    except ValidationError as e:
+        raise OutlinePatchError(f"replace_text leaves an invalid {type(model).__name__}: {e}") from e
+
+def _check_index(index, items, name, allow_end=False):
+    upper = len(items) + (1 if allow_end else 0)
+    if index is None or not 0 <= index < upper:
+        raise OutlinePatchError(f"{name} index {index} is out of range (0-{upper - 1})")
+
+def _require(operation: OutlineOperation, field):
+    value = getattr(operation, field)
+    if value is None:
+        raise OutlinePatchError(f"{operation.op} needs {field}")
+    return value
+
+def apply_outline_patch(outline: TopicOutline, patch: OutlinePatch) -> TopicOutline:
+    """
+    Applies the operations of the patch in order and returns the updated outline.
+
+    The original outline is not modified. Sections and speakers that no operation touches are
+    carried over unchanged, so they serialize byte-identically and caches keyed on them stay valid.
+
+    Raises:
+        OutlinePatchError: If there is no patch (e.g. the model refused), or an operation refers
+            to a missing section or speaker, lacks a field or leaves an invalid outline.
+    """
+    if patch is None:
+        raise OutlinePatchError("no patch was returned")
+    context = outline.context
+    sections = list(outline.sections)
+    speakers = list(outline.speakers)
+
+    for operation in patch.operations:
+        if operation.op == "set_context":
+            context = _require(operation, "context")
+        elif operation.op == "replace_text":
+            old = _require(operation, "old_text")
+            new = _require(operation, "new_text")
+            if not old:
+                raise OutlinePatchError("replace_text needs a non-empty old_text")
+            context = context.replace(old, new)
+            sections = [_replace_text(section, old, new) for section in sections]
+            speakers = [_replace_text(speaker, old, new) for speaker in speakers]
+        elif operation.op == "update_section":
+            _check_index(operation.index, sections, "Section")
+            sections[operation.index] = _require(operation, "section")
+        elif operation.op == "insert_section":
+            _check_index(operation.index, sections, "Section", allow_end=True)
+            sections.insert(operation.index, _require(operation, "section"))
+        elif operation.op == "remove_section":
+            _check_index(operation.index, sections, "Section")
+            del sections[operation.index]
+        elif operation.op == "move_section":
+            _check_index(operation.index, sections, "Section")
+            section = sections.pop(operation.index)
+            _check_index(operation.to_index, sections, "Section", allow_end=True)
+            sections.insert(operation.to_index, section)
+        elif operation.op == "update_speaker":
+            _check_index(operation.index, speakers, "Speaker")
+            speakers[operation.index] = _require(operation, "speaker")
+        elif operation.op == "add_speaker":
+            speakers.append(_require(operation, "speaker"))
+        elif operation.op == "remove_speaker":
+            _check_index(operation.index, speakers, "Speaker")
+            del speakers[operation.index]
+
+    return outline.model_copy(update={
+        "context": context,
+        "sections": sections,
+        "speakers": speakers,
+        "num_speakers": len(speakers) if len(speakers) != len(outline.speakers) else outline.num_speakers,
+    })
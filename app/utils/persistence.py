@@ -1,7 +1,6 @@
 import fsspec
 import pydantic
 import typing
-import yaml
 import hashlib
 import streamlit as st
 import json
@@ -12,13 +11,12 @@ import shutil
 import tempfile
 from pydantic import AnyUrl
 import streamlit as st
+from utils.config import get_setting
+from utils.cache_store import CacheStore
 
-if "config" not in st.session_state:
-    with open('config.yaml', 'r', encoding='utf-8') as file:
-        st.session_state.config = yaml.load(file, Loader=yaml.SafeLoader)
-
-persistence_base = st.session_state.config.get(
-    "persistence", {}).get("base", "file:.")
+# Read through utils.config rather than from the working directory, so scripts run
+# outside the repository root (e.g. app/agentwrite) persist to the same place
+persistence_base = get_setting("persistence", "base", "file:.")
 
 def to_json_safe(obj):
     if isinstance(obj, AnyUrl):
@@ -105,6 +103,51 @@ def persist_file(local_file, name):
             shutil.copyfileobj(src, f)
     return f.url
 
+
+def open_cache_store(name, max_bytes):
+    """
+    Returns a size-capped, least-recently-used CacheStore under {persistence_base}/cache/{name}.
+    """
+    return CacheStore(f"{persistence_base}/cache/{name}", max_bytes)
+
+def checkpoint_url(name):
+    return f"{persistence_base}/checkpoints/{name}.json"
+
+def load_checkpoint(name):
+    """
+    Returns the data last saved with save_checkpoint(name, data), or None.
+    """
+    fs, path = fsspec.core.url_to_fs(checkpoint_url(name))
+    if not fs.exists(path):
+        return None
+    try:
+        with fs.open(path, "r") as f:
+            return json.load(f)
+    except json.JSONDecodeError as e:
+        print(f"Ignoring unreadable checkpoint {name}: {e}")
+        return None
+
+def save_checkpoint(name, data):
+    """
+    Saves JSON-serializable data under name, replacing the previous checkpoint.
+    """
+    fs, path = fsspec.core.url_to_fs(checkpoint_url(name))
+    parent = path.rsplit("/", 1)[0]
+    fs.makedirs(parent, exist_ok=True)
+    # Write next to the checkpoint and move it into place, so an interrupted write
+    # never leaves a truncated checkpoint behind
+    temp_path = f"{path}.tmp"
+    fs.pipe_file(temp_path, json.dumps(to_json_safe(data), ensure_ascii=False).encode("utf-8"))
+    fs.mv(temp_path, path)
+
+def delete_checkpoint(name):
+    """
+    Removes the checkpoint saved under name, if there is one.
+    """
+    fs, path = fsspec.core.url_to_fs(checkpoint_url(name))
+    if fs.exists(path):
+        fs.rm(path)
+
     
 if __name__ == "__main__":
     class LongStory(PersistedModel):
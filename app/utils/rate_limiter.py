@@ -0,0 +1,265 @@
+import time
+import random
+import asyncio
+import functools
+import threading
+import email.utils
+import openai
+import requests
+from utils.config import get_setting, load_config
+from utils.token_estimator import TokenEstimator
+
+class RateLimiter:
+    """
+    Keeps one model's calls under its requests-per-minute and tokens-per-minute budgets.
+
+    Both budgets are token buckets that refill continuously. Callers reserve one request
+    and their estimated tokens before each call and wait while either bucket is empty or
+    while the model is paused after a 429 response.
+    """
+
+    def __init__(self, rpm=None, tpm=None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm) if rpm else 0.0
+        self._tokens = float(tpm) if tpm else 0.0
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+        self.queue_depth = 0
+        self.calls = 0
+        self.throttled_calls = 0
+        self.throttled_seconds = 0.0
+        self.rate_limited = 0
+        self.retries = 0
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    def _try_acquire(self, tokens):
+        """
+        Reserves the budget for one call and returns 0, or returns the seconds to wait.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(0.0, self._paused_until - now)
+            if self.rpm and self._requests < 1:
+                wait = max(wait, (1 - self._requests) * 60 / self.rpm)
+            if self.tpm:
+                # A single call larger than the whole budget only has to wait for a full bucket
+                tokens = min(tokens, self.tpm)
+                if self._tokens < tokens:
+                    wait = max(wait, (tokens - self._tokens) * 60 / self.tpm)
+            if wait > 0:
+                return wait
+            if self.rpm:
+                self._requests -= 1
+            if self.tpm:
+                self._tokens -= tokens
+            self.calls += 1
+            return 0.0
+
+    def _record_wait(self, waited):
+        # Anything above a millisecond means the call had to wait for budget
+        if waited > 0.001:
+            with self._lock:
+                self.throttled_calls += 1
+                self.throttled_seconds += waited
+
+    def acquire(self, tokens=0):
+        """
+        Blocks until the call fits in the budget.
+        """
+        with self._lock:
+            self.queue_depth += 1
+        start = time.monotonic()
+        try:
+            while (wait := self._try_acquire(tokens)) > 0:
+                time.sleep(wait)
+        finally:
+            with self._lock:
+                self.queue_depth -= 1
+        self._record_wait(time.monotonic() - start)
+
+    async def acquire_async(self, tokens=0):
+        """
+        Like acquire(), but sleeps without blocking the event loop.
+        """
+        with self._lock:
+            self.queue_depth += 1
+        start = time.monotonic()
+        try:
+            while (wait := self._try_acquire(tokens)) > 0:
+                await asyncio.sleep(wait)
+        finally:
+            with self._lock:
+                self.queue_depth -= 1
+        self._record_wait(time.monotonic() - start)
+
+    def release(self, estimated_tokens, actual_tokens):
+        """
+        Returns the unused part of a token reservation once the actual usage is known.
+        """
+        if self.tpm and actual_tokens is not None and actual_tokens < estimated_tokens:
+            with self._lock:
+                self._tokens = min(self.tpm, self._tokens + estimated_tokens - actual_tokens)
+
+    def note_failure(self, error, delay):
+        """
+        Records a failed attempt; a 429 pauses every caller of this model for the delay.
+        """
+        with self._lock:
+            self.retries += 1
+            if _status_code(error) == 429:
+                self.rate_limited += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+
+    def metrics(self):
+        with self._lock:
+            return {
+                "rpm": self.rpm,
+                "tpm": self.tpm,
+                "queue_depth": self.queue_depth,
+                "calls": self.calls,
+                "throttled_calls": self.throttled_calls,
+                "throttled_seconds": round(self.throttled_seconds, 2),
+                "rate_limited": self.rate_limited,
+                "retries": self.retries,
+            }
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_rate_limiter(model):
+    """
+    Returns the process-wide RateLimiter for a model, configured from rate_limits in config.yaml.
+    """
+    with _limiters_lock:
+        if model not in _limiters:
+            rate_limits = load_config().get("rate_limits") or {}
+            limits = rate_limits.get(model) or rate_limits.get("default") or {}
+            _limiters[model] = RateLimiter(rpm=limits.get("rpm"), tpm=limits.get("tpm"))
+        return _limiters[model]
+
+def get_all_metrics():
+    """
+    Returns the scheduler metrics of every model used so far.
+    """
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {model: limiter.metrics() for model, limiter in limiters.items()}
+
+@functools.lru_cache(maxsize=None)
+def _get_estimator(model):
+    try:
+        return TokenEstimator(model)
+    except KeyError:
+        return TokenEstimator()
+
+def estimate_request_tokens(model, messages, max_tokens=None):
+    """
+    Tokens a chat request counts against the TPM budget: the prompt plus max_tokens.
+    """
+    return _get_estimator(model).count_message_tokens(messages) + (max_tokens or 0)
+
+def _status_code(error):
+    status = getattr(error, "status_code", None)
+    if status is None and getattr(error, "response", None) is not None:
+        status = getattr(error.response, "status_code", None)
+    return status
+
+def is_retryable(error):
+    """
+    True for rate limits, server errors, timeouts and connection errors.
+    """
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError,
+                          requests.ConnectionError, requests.Timeout)):
+        return True
+    status = _status_code(error)
+    return status is not None and (status == 429 or status == 408 or status >= 500)
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+def retry_delay(error, attempt):
+    """
+    Seconds to wait before retrying: the server's Retry-After if given, otherwise
+    exponential backoff with jitter.
+    """
+    retry_after = _retry_after(error)
+    if retry_after is not None:
+        return retry_after
+    base_delay = get_setting("retries", "base_delay", 1)
+    max_delay = get_setting("retries", "max_delay", 60)
+    delay = min(max_delay, base_delay * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+def call_with_retries(fn, model, tokens=0, max_attempts=None, retryable=is_retryable):
+    """
+    Calls fn() within the model's rate limits, retrying retryable errors.
+
+    Args:
+        fn (callable): Performs the call.
+        model (str): The model whose RPM/TPM budget the call counts against.
+        tokens (int): Estimated tokens of the call (see estimate_request_tokens).
+        max_attempts (int): Maximum number of attempts (defaults to retries.max_attempts).
+        retryable (callable): Decides whether an error is worth retrying.
+    """
+    limiter = get_rate_limiter(model)
+    max_attempts = max_attempts or get_setting("retries", "max_attempts", 6)
+    for attempt in range(max_attempts):
+        limiter.acquire(tokens)
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == max_attempts - 1 or not retryable(e):
+                raise
+            delay = retry_delay(e, attempt)
+            limiter.note_failure(e, delay)
+            print(f"Retrying {model} call in {delay:.1f}s after error: {e}")
+            time.sleep(delay)
+
+async def acall_with_retries(fn, model, tokens=0, max_attempts=None, retryable=is_retryable):
+    """
+    Like call_with_retries, for a fn() that returns an awaitable.
+    """
+    limiter = get_rate_limiter(model)
+    max_attempts = max_attempts or get_setting("retries", "max_attempts", 6)
+    for attempt in range(max_attempts):
+        await limiter.acquire_async(tokens)
+        try:
+            return await fn()
+        except Exception as e:
+            if attempt == max_attempts - 1 or not retryable(e):
+                raise
+            delay = retry_delay(e, attempt)
+            limiter.note_failure(e, delay)
+            print(f"Retrying {model} call in {delay:.1f}s after error: {e}")
+            await asyncio.sleep(delay)
@@ -1,11 +1,16 @@
 # utils/read_wrapper.py
+import io
 import os
-import tempfile
 import requests
 from pydub import AudioSegment
 from dotenv import load_dotenv
 from typing import List
 from . import persistence
+from .openai_utils import get_http_session
+from .rate_limiter import call_with_retries
+from .audio_assembler import AudioAssembler
+from .tts_cache import cached_tts
+from .mp3_concat import join_mp3
 
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -25,11 +30,17 @@ def split_text(text: str, max_length=MAX_TTS_INPUT_LENGTH) -> List[str]:
     return chunks
 
 def generate_tts_audio(text: str, voice: str = "nova") -> str:
+    """
+    Reads the text with the voice and persists the MP3; returns its url.
+
+    The MP3 chunks the API returns are joined frame by frame (see utils.mp3_concat)
+    instead of being decoded and re-encoded.
+    """
     if not OPENAI_API_KEY:
         raise ValueError("Missing OpenAI API Key!")
 
     chunks = split_text(text)
-    audio_segments = []
+    clips = []
 
     for i, chunk in enumerate(chunks):
         url = "https://api.openai.com/v1/audio/speech"
@@ -43,21 +54,31 @@ def generate_tts_audio(text: str, voice: str = "nova") -> str:
             "input": chunk
         }
 
-        response = requests.post(url, headers=headers, json=data)
-        if response.status_code != 200:
-            raise Exception(f"TTS chunk failed: {response.text}")
+        def post():
+            response = get_http_session().post(url, headers=headers, json=data)
+            response.raise_for_status()
+            return response
+
+        try:
+            content = cached_tts(f"openai:{voice}", TTS_MODEL, chunk, lambda: call_with_retries(post, TTS_MODEL).content)
+        except requests.HTTPError as e:
+            raise Exception(f"TTS chunk failed: {e.response.text}") from e
 
-        # Save to temp file
-        temp_mp3 = tempfile.NamedTemporaryFile(delete=False, suffix=".mp3")
-        with open(temp_mp3.name, "wb") as f:
-            f.write(response.content)
-        audio_segments.append(AudioSegment.from_mp3(temp_mp3.name))
-        os.remove(temp_mp3.name)
+        clips.append(content)
 
-    # Merge audio
-    final_audio = sum(audio_segments[1:], audio_segments[0]) if len(audio_segments) > 1 else audio_segments[0]
+    try:
+        joined = join_mp3(clips)
+    except ValueError as e:
+        # Chunks that cannot be joined as they are are decoded and encoded once
+        print(f"Re-encoding TTS chunks: {e}")
+        final_audio = AudioAssembler()
+        for clip in clips:
+            final_audio.append(AudioSegment.from_file(io.BytesIO(clip), format="mp3"))
+        buffer = io.BytesIO()
+        final_audio.export(buffer, format="mp3")
+        joined = buffer.getvalue()
 
     with persistence.write_persisted_file(".mp3", "wb") as f:
-        final_audio.export(f, format="mp3")
+        f.write(joined)
 
     return f.url
@@ -0,0 +1,70 @@
+from utils.token_estimator import TokenEstimator
+
+class RollingContext:
+    """
+    Bounded "already written text" for step-by-step story writing.
+
+    The last keep_paragraphs paragraphs are kept verbatim. Older paragraphs are folded into
+    a running summary one at a time as they leave that window, so each paragraph is
+    summarized once and the rendered context stays under max_tokens however long the
+    story gets.
+    """
+
+    def __init__(self, summarize, keep_paragraphs=3, max_tokens=3000, summary_tokens=400, estimator=None):
+        """
+        Args:
+            summarize (callable): summarize(summary, paragraph, max_tokens) returns the
+                running summary with the paragraph folded in, in at most max_tokens tokens.
+            keep_paragraphs (int): Number of recent paragraphs kept verbatim.
+            max_tokens (int): Token budget of the rendered context.
+            summary_tokens (int): Token budget of the running summary.
+            estimator (TokenEstimator): Used to count tokens.
+        """
+        self.summarize = summarize
+        self.keep_paragraphs = max(1, keep_paragraphs)
+        self.max_tokens = max_tokens
+        self.summary_tokens = summary_tokens
+        self.estimator = estimator or TokenEstimator()
+        self.summary = ""
+        self.paragraphs = []
+
+    def count_tokens(self, text):
+        return len(self.estimator.encoder.encode(text))
+
+    def _fold_oldest(self):
+        paragraph = self.paragraphs.pop(0)
+        self.summary = self.summarize(self.summary, paragraph, self.summary_tokens).strip()
+
+    def add(self, paragraph):
+        """
+        Appends a paragraph, summarizing the oldest verbatim ones while the window or the
+        token budget is exceeded. The newest paragraph is always kept verbatim.
+        """
+        paragraph = paragraph.strip()
+        if not paragraph:
+            return
+        self.paragraphs.append(paragraph)
+        while len(self.paragraphs) > self.keep_paragraphs:
+            self._fold_oldest()
+        while len(self.paragraphs) > 1 and self.count_tokens(self.render()) > self.max_tokens:
+            self._fold_oldest()
+
+    def state(self):
+        """
+        Returns the summary and recent paragraphs, to restore with load_state().
+        """
+        return {"summary": self.summary, "paragraphs": list(self.paragraphs)}
+
+    def load_state(self, state):
+        self.summary = state.get("summary", "")
+        self.paragraphs = list(state.get("paragraphs", []))
+
+    def render(self):
+        """
+        Returns the context to substitute for $TEXT$: the summary of the earlier text
+        followed by the recent paragraphs.
+        """
+        recent = "\n\n".join(self.paragraphs)
+        if not self.summary:
+            return recent
+        return f"[Summary of the earlier text]\n{self.summary}\n\n[Most recent paragraphs]\n{recent}"
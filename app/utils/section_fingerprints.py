@@ -0,0 +1,62 @@
+import json
+import hashlib
+from utils.data_models import TopicOutline, PlannedSegment
+
+def section_fingerprint(outline: TopicOutline, section_index: int, segments: list[PlannedSegment], document_context=None, model=None) -> str:
+    """
+    Hash of everything the generated segments of one section depend on: the section itself,
+    how it is split into segments, whether one of them opens or closes the conversation
+    (the prompt says so), the context, the speakers, the length, the document context and
+    the model writing them. Segment numbers are left out, so adding or removing segments
+    in one section does not change the fingerprint of the others.
+
+    Token budgets are left out on purpose: they follow the measured rates (see
+    utils.length_controller) and would change the fingerprint on every run.
+    """
+    payload = {
+        "section": outline.sections[section_index].model_dump(mode="json"),
+        "segments": [
+            [dp.text for dp in segment.discussion_points]
+            for segment in segments if segment.section_index == section_index
+        ],
+        "opens_closes": [
+            [i == 0, i == len(segments) - 1]
+            for i, segment in enumerate(segments) if segment.section_index == section_index
+        ],
+        "model": model,
+        "context": outline.context,
+        "speakers": [speaker.model_dump(mode="json") for speaker in outline.speakers],
+        "num_speakers": outline.num_speakers,
+        "length_minutes": outline.length_minutes,
+        "document_context": document_context,
+    }
+    payload_json = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload_json.encode("utf-8")).hexdigest()
+
+def _segments_by_section(segments):
+    by_section = {}
+    for segment_index, segment in enumerate(segments):
+        by_section.setdefault(segment.section_index, []).append(segment_index)
+    return by_section
+
+def find_reusable_segments(store: dict, outline: TopicOutline, segments: list[PlannedSegment], document_context=None, model=None) -> dict:
+    """
+    Returns {segment index: utterances} for the segments of every section whose fingerprint
+    has stored segments, i.e. whose inputs did not change since they were generated.
+    """
+    reusable = {}
+    for section_index, segment_indexes in _segments_by_section(segments).items():
+        stored = store.get(section_fingerprint(outline, section_index, segments, document_context, model))
+        if stored is not None and len(stored) == len(segment_indexes):
+            reusable.update(zip(segment_indexes, stored))
+    return reusable
+
+def store_section_segments(store: dict, outline: TopicOutline, segments: list[PlannedSegment], conversation_pieces: list, document_context=None, model=None):
+    """
+    Stores the generated utterances of every section against its fingerprint. Sections with
+    a failed (empty) segment are not stored, so they are generated again next time.
+    """
+    for section_index, segment_indexes in _segments_by_section(segments).items():
+        utterances = [list(conversation_pieces[i].utterances) for i in segment_indexes]
+        if all(utterances):
+            store[section_fingerprint(outline, section_index, segments, document_context, model)] = utterances
@@ -0,0 +1,56 @@
+import math
+from utils.data_models import TopicOutline, PlannedSegment
+from utils.token_estimator import TokenEstimator
+
+def plan_segments(outline: TopicOutline, estimator: TokenEstimator = None) -> list[PlannedSegment]:
+    """
+    Maps the token budget for the requested length onto the outline sections, once.
+
+    Every section gets a share of the total budget proportional to its number of discussion
+    points. A section whose share does not fit in a single completion is split into several
+    segments along its discussion points. Each planned segment is generated exactly once.
+
+    Args:
+        outline (TopicOutline): The outline of the conversation.
+        estimator (TokenEstimator): Estimator used for the token budget.
+
+    Returns:
+        list: The planned segments, in conversation order.
+    """
+    estimator = estimator or TokenEstimator()
+    total_tokens = estimator.get_tokens_per_split(outline.length_minutes, 1)
+    sections = outline.sections
+    if not sections:
+        return []
+
+    weights = [max(1, len(section.discussion_points)) for section in sections]
+    total_weight = sum(weights)
+
+    segments = []
+    for section_index, (section, weight) in enumerate(zip(sections, weights)):
+        section_tokens = total_tokens * weight // total_weight
+        num_segments = math.ceil(section_tokens / estimator.max_output_tokens)
+        # A segment needs at least one discussion point to talk about
+        num_segments = max(1, min(num_segments, len(section.discussion_points)))
+        tokens = min(estimator.max_output_tokens, max(1, section_tokens // num_segments))
+
+        points = section.discussion_points
+        for i in range(num_segments):
+            start = i * len(points) // num_segments
+            end = (i + 1) * len(points) // num_segments
+            segments.append(PlannedSegment(
+                section_index=section_index,
+                focus=section.focus,
+                discussion_points=points[start:end],
+                tokens=tokens
+            ))
+
+    return segments
+
+def count_planned_calls(segments: list[PlannedSegment], concurrent: bool, self_summarize: bool = True) -> int:
+    """
+    Number of LLM calls needed to generate the planned segments. Without self-summarizing
+    responses the serial path also makes a summary call after every segment; the concurrent
+    path uses outline hand-offs instead.
+    """
+    return len(segments) if concurrent or self_summarize else 2 * len(segments)
@@ -23,4 +23,11 @@ class TokenEstimator:
         """
         total_words = total_minutes * self.words_per_minute
         total_tokens = int(total_words * self.tokens_per_word)
-        return total_tokens // num_splits
\ No newline at end of file
+        return total_tokens // num_splits
+
+    def count_message_tokens(self, messages):
+        """
+        Estimerer antall prompt-tokens for en liste med chat-meldinger.
+        """
+        # Every message carries a few tokens of overhead for role and separators
+        return sum(len(self.encoder.encode(str(message.get("content", "")))) + 4 for message in messages) + 3
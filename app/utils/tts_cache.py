@@ -0,0 +1,63 @@
+import re
+import json
+import hashlib
+import functools
+import unicodedata
+from utils.config import get_setting
+
+def normalize_text(text):
+    """
+    The text as it is spoken: Unicode-normalized, with runs of whitespace collapsed.
+    """
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+def tts_cache_key(voice, model, text):
+    """
+    Content address of a rendered clip: the voice ("provider:voice"), the TTS model and
+    the normalized text.
+    """
+    payload = json.dumps([voice, model, normalize_text(text)], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+@functools.lru_cache(maxsize=1)
+def get_tts_cache():
+    """
+    Returns the process-wide TTS clip cache under persistence.base (see
+    utils.persistence.open_cache_store), or None if it is disabled in config.yaml.
+    """
+    if not get_setting("tts_cache", "enabled", True):
+        return None
+    # persistence imports streamlit and pydantic, so it is only loaded when the cache is used
+    from utils.persistence import open_cache_store
+    return open_cache_store("tts", int(get_setting("tts_cache", "max_mb", 2048) * 1024 * 1024))
+
+def lookup_tts(voice, model, text):
+    """
+    Returns the cached clip (bytes) for the voice, model and text, or None on a miss or
+    if the cache is disabled. Errors of the cache itself count as a miss.
+    """
+    cache = get_tts_cache()
+    if cache is None:
+        return None
+    try:
+        return cache.get(tts_cache_key(voice, model, text))
+    except Exception as e:
+        print(f"TTS cache lookup failed: {e}")
+        return None
+
+def cached_tts(voice, model, text, render):
+    """
+    Returns the cached clip (bytes) for the voice, model and text, or calls render() and
+    caches the bytes it returns. Errors of the cache itself never fail the rendering.
+    """
+    data = lookup_tts(voice, model, text)
+    if data is not None:
+        return data
+    data = render()
+    cache = get_tts_cache()
+    if data and cache is not None:
+        try:
+            cache.put(tts_cache_key(voice, model, text), data)
+        except Exception as e:
+            print(f"TTS cache store failed: {e}")
+    return data
@@ -1,20 +1,28 @@
-import faiss
-from sentence_transformers import SentenceTransformer
-import numpy as np
 import os
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
 
 class VectorStore:
+    # faiss and sentence_transformers take seconds to import, so they are only loaded
+    # once a document is actually indexed or queried.
     def __init__(self):
         self.index = None
-        self.model = SentenceTransformer("all-MiniLM-L6-v2")
+        self._model = None
         self.chunk_embeddings = []
 
+    @property
+    def model(self):
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+            self._model = SentenceTransformer("all-MiniLM-L6-v2")
+        return self._model
+
     def create_index(self, chunks):
         """
         Creates a FAISS index for the document chunks.
         """
+        import faiss
+        import numpy as np
         self.chunk_embeddings = [self.model.encode(chunk) for chunk in chunks]
         embeddings_array = np.vstack(self.chunk_embeddings)
         self.index = faiss.IndexFlatL2(embeddings_array.shape[1])
@@ -26,4 +34,4 @@ class VectorStore:
         """
         query_embedding = self.model.encode(query_text).reshape(1, -1)
         distances, indices = self.index.search(query_embedding, top_k)
-        return [(self.chunk_embeddings[i], distances[i]) for i in indices[0]]
\ No newline at end of file
+        return [(self.chunk_embeddings[i], distances[i]) for i in indices[0]]
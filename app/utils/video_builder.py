@@ -4,7 +4,6 @@ import fsspec
 from . import persistence
 import tempfile
 import contextlib
-import adlfs
 import shutil
 from dotenv import load_dotenv
 from contextlib import ExitStack
@@ -19,6 +18,7 @@ def normalize_file_url(path: str) -> str:
     return path
 
 def generate_clips_from_images(images):
+    import adlfs
     load_dotenv()
     
     # Initialize the AzureBlobFileSystem once
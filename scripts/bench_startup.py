@@ -0,0 +1,154 @@
+"""
+Startup benchmark for the Streamlit app.
+
+Measures the cold import time of every module the app imports on startup (each in a
+fresh interpreter, so nothing is shared between measurements) and the time to the
+first render of app/main.py, and compares them against a stored baseline.
+
+Each import is compared as a share of the first render rather than in seconds, so a
+baseline stored on one machine still holds on a faster or slower one.
+
+Usage (from the repository root):
+    python scripts/bench_startup.py                    # compare against the baseline
+    python scripts/bench_startup.py --update-baseline  # store the current timings
+
+Exits with status 1 if any import's share of the first render is more than --threshold
+larger than in the baseline, and
+with status 2 if there is no baseline to compare against (store one with --update-baseline).
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(REPO_ROOT, "app")
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "startup_baseline.json")
+
+# Modules imported by app/main.py, in the order it imports them
+MODULES = [
+    "auth",
+    "outline",
+    "conversation",
+    "audio",
+    "text_to_image",
+    "document_section",
+    "utils.rate_limiter",
+    "utils.model_routing",
+]
+
+# Differences below this many seconds are noise, whatever the relative threshold says
+MIN_REGRESSION_SECONDS = 0.05
+
+def measure_import(module):
+    """
+    Returns the seconds a fresh interpreter spends importing module, from -X importtime.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=APP_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+    # The last line is the top-level module; its cumulative time includes everything it imported
+    for line in reversed(result.stderr.splitlines()):
+        if line.startswith("import time:") and line.split("|")[-1].strip() == module:
+            return int(line.split("|")[1]) / 1e6
+    raise RuntimeError(f"No import time reported for {module}")
+
+def measure_first_render():
+    """
+    Returns the seconds from a cold interpreter to the end of the first script run of app/main.py.
+    """
+    code = (
+        "import time; start = time.perf_counter()\n"
+        "from streamlit.testing.v1 import AppTest\n"
+        "at = AppTest.from_file('app/main.py', default_timeout=120).run()\n"
+        "assert not at.exception, at.exception\n"
+        "print(time.perf_counter() - start)\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=REPO_ROOT, capture_output=True, text=True,
+        env={**os.environ, "PYTHONPATH": APP_DIR}
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Rendering app/main.py failed:\n{result.stderr}")
+    return float(result.stdout.strip().splitlines()[-1])
+
+def run_benchmark(repeat):
+    """
+    Returns ({name: fastest seconds} for every module import and the first render,
+    {import name: fraction of the first render}).
+
+    Load on the machine only ever adds time, so the fastest of the rounds is the most
+    stable estimate; every round measures all imports and then the first render.
+    """
+    rounds = []
+    for _ in range(repeat):
+        timings = {f"import {module}": measure_import(module) for module in MODULES}
+        timings["first render"] = measure_first_render()
+        rounds.append(timings)
+
+    timings = {name: min(r[name] for r in rounds) for name in rounds[0]}
+    shares = {name: seconds / timings["first render"] for name, seconds in timings.items() if name != "first render"}
+    for name, seconds in timings.items():
+        share = f" ({shares[name] * 100:.0f}% of the first render)" if name in shares else ""
+        print(f"{name}: {seconds:.3f}s{share}")
+    return timings, shares
+
+def find_regressions(shares, baseline_shares, first_render, threshold):
+    """
+    Returns a message for every import whose share of the first render is more than
+    threshold (a fraction) larger than in the baseline.
+    """
+    regressions = []
+    for name, share in shares.items():
+        before = baseline_shares.get(name)
+        if before is None:
+            continue
+        grown_seconds = (share - before) * first_render
+        if share > before * (1 + threshold) and grown_seconds > MIN_REGRESSION_SECONDS:
+            regressions.append(
+                f"{name}: {before * 100:.0f}% -> {share * 100:.0f}% of the first render (+{(share / before - 1) * 100:.0f}%)"
+            )
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Rounds of measurements; the fastest is used")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed growth of an import's share of the first render, as a fraction")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Baseline JSON file")
+    parser.add_argument("--update-baseline", action="store_true", help="Store the timings as the new baseline")
+    args = parser.parse_args()
+
+    if not args.update_baseline and not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to store one.")
+        return 2
+
+    start = time.perf_counter()
+    timings, shares = run_benchmark(args.repeat)
+    print(f"Benchmark took {time.perf_counter() - start:.1f}s")
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            # Seconds are kept for reference only; regressions are judged on the shares
+            json.dump({"render_shares": shares, "seconds": timings}, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = find_regressions(shares, baseline["render_shares"], timings["first render"], args.threshold)
+    if regressions:
+        print("Startup regressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print("No startup regressions.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())